@@ -0,0 +1,45 @@
+"""
+Кэш представлений рецептов, не зависящих от пользователя.
+
+В кэше хранится вывод RecipeGetSerializer без флагов is_favorited,
+is_in_shopping_cart и author.is_subscribed — они подставляются
+при каждом ответе. Ключ содержит версию рецепта из recipes.versions,
+поэтому любое изменение рецепта, его тегов, ингредиентов или профиля
+автора делает запись недоступной.
+"""
+from django.core.cache import cache
+
+from recipes.constants import RECIPE_CACHE_TIMEOUT
+from recipes.versions import get_versions, recipe_key
+
+VIEWER_FIELDS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def recipe_cache_keys(recipe_ids, scope=''):
+    """
+    Возвращает словарь {id рецепта: ключ представления}.
+    scope отделяет записи с абсолютными URL разных хостов.
+    """
+    versions = get_versions(recipe_key(recipe_id) for recipe_id in recipe_ids)
+    return {
+        recipe_id: f'recipe:{scope}:{recipe_id}:'
+                   f'{versions[recipe_key(recipe_id)]}'
+        for recipe_id in recipe_ids
+    }
+
+
+def get_cached_recipes(keys):
+    return cache.get_many(keys)
+
+
+def cache_recipe(key, data):
+    """Сохраняет представление без полей, зависящих от пользователя."""
+    shared = {
+        field: value for field, value in data.items()
+        if field not in VIEWER_FIELDS
+    }
+    shared['author'] = {
+        field: value for field, value in data['author'].items()
+        if field != 'is_subscribed'
+    }
+    cache.set(key, shared, RECIPE_CACHE_TIMEOUT)
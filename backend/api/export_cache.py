@@ -0,0 +1,191 @@
+"""
+Кэш готовых выгрузок списка покупок.
+
+Каждый документ хранится отдельным файлом в каталоге
+EXPORT_CACHE_LOCATION, поэтому его можно записывать и отдавать потоком,
+не держа целиком в памяти. Файл появляется атомарно (os.replace)
+только после того, как документ записан полностью. Время изменения
+файла служит меткой последнего обращения: попадание обновляет только
+её, без общего индекса, который пришлось бы читать и переписывать
+из разных процессов. Когда суммарный размер превышает
+EXPORT_CACHE_MAX_SIZE, вытесняются файлы с самыми старыми метками.
+Счётчики попаданий и промахов хранятся в кэше по умолчанию
+и доступны через stats().
+"""
+import hashlib
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes.constants import EXPORT_CACHE_CHUNK_SIZE, EXPORT_TEMP_MAX_AGE
+
+HITS_KEY = 'exports:hits'
+MISSES_KEY = 'exports:misses'
+TEMP_PREFIX = '.'
+
+
+def read_chunks(file, chunk_size=EXPORT_CACHE_CHUNK_SIZE):
+    """Читает файл частями и закрывает его."""
+    with file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+class ExportWriter:
+    """
+    Запись документа во временный файл кэша. Документ становится
+    доступен только после commit(); abort() удаляет недописанный файл.
+    """
+
+    def __init__(self, export_cache, key):
+        self.export_cache = export_cache
+        self.key = key
+        self.size = 0
+        os.makedirs(export_cache.location, exist_ok=True)
+        self.file = tempfile.NamedTemporaryFile(
+            dir=export_cache.location, prefix=TEMP_PREFIX, delete=False)
+
+    def write(self, chunk):
+        if self.file is None:
+            return
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        self.size += len(chunk)
+        if self.size > self.export_cache.get_max_size():
+            self.abort()
+            return
+        self.file.write(chunk)
+
+    def commit(self):
+        if self.file is None:
+            return
+        self.file.close()
+        os.replace(self.file.name, self.export_cache.path(self.key))
+        self.file = None
+        self.export_cache.evict()
+
+    def abort(self):
+        if self.file is None:
+            return
+        self.file.close()
+        try:
+            os.remove(self.file.name)
+        except FileNotFoundError:
+            pass
+        self.file = None
+
+
+class ExportCache:
+    def __init__(self, location=None, max_size=None):
+        self._location = location
+        self.max_size = max_size
+
+    @property
+    def location(self):
+        return self._location or settings.EXPORT_CACHE_LOCATION
+
+    def get_max_size(self):
+        if self.max_size is not None:
+            return self.max_size
+        return settings.EXPORT_CACHE_MAX_SIZE
+
+    def path(self, key):
+        return os.path.join(
+            self.location, hashlib.sha1(key.encode()).hexdigest())
+
+    def count(self, key):
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+    def open(self, key):
+        """
+        Возвращает файл документа, открытый на чтение, или None.
+        Попадание обновляет метку обращения к файлу.
+        """
+        path = self.path(key)
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            self.count(MISSES_KEY)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self.count(HITS_KEY)
+        return file
+
+    def get(self, key):
+        file = self.open(key)
+        if file is None:
+            return None
+        with file:
+            return file.read()
+
+    def writer(self, key):
+        return ExportWriter(self, key)
+
+    def set(self, key, content):
+        writer = self.writer(key)
+        writer.write(content)
+        writer.commit()
+
+    def entries(self):
+        """Список (метка обращения, размер, путь) готовых документов."""
+        entries = []
+        try:
+            scan = os.scandir(self.location)
+        except FileNotFoundError:
+            return entries
+        stale_before = time.time() - EXPORT_TEMP_MAX_AGE
+        with scan:
+            for entry in scan:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.startswith(TEMP_PREFIX):
+                    # Файл, брошенный упавшим процессом.
+                    if stat.st_mtime < stale_before:
+                        self.remove(entry.path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """Удаляет давно не запрашивавшиеся документы сверх лимита."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        max_size = self.get_max_size()
+        for _, size, path in sorted(entries):
+            if total <= max_size:
+                break
+            self.remove(path)
+            total -= size
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            'hits': cache.get(HITS_KEY, 0),
+            'misses': cache.get(MISSES_KEY, 0),
+            'entries': len(entries),
+            'size': sum(size for _, size, _ in entries),
+        }
+
+
+export_cache = ExportCache()
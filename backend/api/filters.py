@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model
 from django_filters import rest_framework as filters
 from recipes.models import Recipe
+from recipes.search import search_recipes
 
 
 User = get_user_model()
@@ -19,10 +20,12 @@ class RecipeFilter(filters.FilterSet):
     author = filters.ModelChoiceFilter(
         field_name='author',
         queryset=User.objects.all())
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ['is_favorited', 'is_in_shopping_cart', 'tags', 'author']
+        fields = ['is_favorited', 'is_in_shopping_cart', 'tags', 'author',
+                  'search']
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -35,3 +38,12 @@ class RecipeFilter(filters.FilterSet):
         if value and not user.is_anonymous:
             return queryset.filter(in_cart__user=user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """
+        Полнотекстовый поиск по названию и описанию,
+        результаты отсортированы по релевантности.
+        """
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
@@ -0,0 +1,126 @@
+"""
+Поисковый индекс ингредиентов в памяти процесса.
+
+Справочник ингредиентов небольшой и меняется редко, поэтому
+он целиком загружается в память один раз на процесс и
+перестраивается, когда меняется версия таблицы ингредиентов
+(recipes.versions). Её меняют сигналы, импорт справочника и команды,
+вставляющие ингредиенты без сигналов, поэтому изменения из других
+процессов сразу попадают в поиск, а сам поиск не сканирует таблицу.
+Представление передаёт версию, уже прочитанную для ETag, так что
+поиск не делает отдельного запроса. Порядок выдачи: сначала
+совпадения по началу названия, затем по подстроке, затем похожие
+по триграммам названия, что помогает при опечатках.
+"""
+import bisect
+import threading
+from collections import Counter
+
+from recipes.models import Ingredient
+from recipes.versions import get_versions, table_key
+
+FUZZY_THRESHOLD = 0.3
+
+
+def normalize(text):
+    """Приводит строку к виду для сравнения без учёта регистра и ё/е."""
+    return text.casefold().replace('ё', 'е').strip()
+
+
+def trigrams(text, padded=True):
+    if padded:
+        text = f'  {text} '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class IngredientSnapshot:
+    """Неизменяемое состояние индекса на момент построения."""
+
+    def __init__(self, rows):
+        self.items = sorted(rows, key=lambda item: normalize(item['name']))
+        self.keys = [normalize(item['name']) for item in self.items]
+        self.trigrams = {}
+        self.trigram_counts = []
+        for position, key in enumerate(self.keys):
+            key_trigrams = trigrams(key)
+            self.trigram_counts.append(len(key_trigrams))
+            for trigram in key_trigrams:
+                self.trigrams.setdefault(trigram, []).append(position)
+
+    def prefix_matches(self, query):
+        start = bisect.bisect_left(self.keys, query)
+        end = start
+        while end < len(self.keys) and self.keys[end].startswith(query):
+            end += 1
+        return list(range(start, end))
+
+    def substring_matches(self, query):
+        if len(query) < 3:
+            candidates = range(len(self.keys))
+        else:
+            postings = sorted(
+                (self.trigrams.get(trigram, ())
+                 for trigram in trigrams(query, padded=False)), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+        return sorted(
+            position for position in candidates
+            if query in self.keys[position]
+            and not self.keys[position].startswith(query))
+
+    def fuzzy_matches(self, query, exclude):
+        query_trigrams = trigrams(query)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(self.trigrams.get(trigram, ()))
+        scored = []
+        for position, count in shared.items():
+            if position in exclude:
+                continue
+            similarity = count / (len(query_trigrams)
+                                  + self.trigram_counts[position] - count)
+            if similarity >= FUZZY_THRESHOLD:
+                scored.append((-similarity, position))
+        return [position for _, position in sorted(scored)]
+
+
+class IngredientIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._snapshot = IngredientSnapshot([])
+
+    def get_version(self):
+        key = table_key('ingredients')
+        return get_versions([key])[key]
+
+    def refresh(self, version=None):
+        """Перестраивает индекс, если версия ингредиентов сменилась."""
+        if version is None:
+            version = self.get_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._snapshot = IngredientSnapshot(
+                        Ingredient.objects.values(
+                            'id', 'name', 'measurement_unit'))
+                    self._version = version
+        return self._snapshot
+
+    def search(self, query, limit=None, version=None):
+        """
+        Возвращает список словарей id, name, measurement_unit,
+        не длиннее limit, если он задан. version — версия таблицы
+        ингредиентов, если она уже прочитана.
+        """
+        snapshot = self.refresh(version)
+        query = normalize(query)
+        if not query:
+            return []
+        positions = snapshot.prefix_matches(query)
+        positions += snapshot.substring_matches(query)
+        if limit is None or len(positions) < limit:
+            positions += snapshot.fuzzy_matches(query, set(positions))
+        return [snapshot.items[position] for position in positions[:limit]]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,127 @@
+"""
+Фоновые выгрузки списка покупок.
+
+Запрос с параметром async=1 ставит задачу ExportJob в очередь и сразу
+получает 202, а документ строит воркер (manage.py run_export_jobs).
+Задачи с одинаковым ключом выгрузки, то есть для той же корзины,
+того же формата и разбивки, не дублируются, пока их результат не
+устарел. Воркер захватывает задачу условным UPDATE, поэтому
+несколько воркеров могут работать с одной таблицей одновременно.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from recipes.models import ExportJob
+
+from .export_cache import export_cache
+from .pdf import render_pdf
+from .shopping_list import (SHOPPING_LIST_FORMATS, get_cart_breakdown,
+                            get_cart_export_key, get_cart_ingredients)
+
+Status = ExportJob.Status
+
+
+def render_export(user, export_format, detailed):
+    """Строит документ выгрузки целиком и возвращает его байты."""
+    ingredients = get_cart_ingredients(user)
+    breakdown = get_cart_breakdown(user) if detailed else None
+    if export_format == 'pdf':
+        return render_pdf(ingredients, breakdown).read()
+    if breakdown is not None:
+        breakdown = breakdown.iterator()
+    iter_content, _ = SHOPPING_LIST_FORMATS[export_format]
+    return ''.join(iter_content(ingredients.iterator(), breakdown)).encode()
+
+
+def enqueue_export(user, export_format, detailed, key=None):
+    """
+    Возвращает действующую задачу для этой выгрузки или создаёт новую.
+    При EXPORT_JOBS_EAGER задача выполняется сразу, без воркера.
+    """
+    if key is None:
+        key = get_cart_export_key(user, export_format, detailed)
+    job = (
+        ExportJob.objects
+        .filter(user=user, key=key,
+                status__in=(Status.PENDING, Status.RUNNING, Status.DONE))
+        .exclude(expires_at__lte=timezone.now())
+        .defer('result')
+        .last()
+    )
+    if job is None:
+        job = ExportJob.objects.create(
+            user=user, export_format=export_format,
+            detailed=detailed, key=key)
+        if settings.EXPORT_JOBS_EAGER and claim_job(job.pk):
+            run_job(job.pk)
+            job.refresh_from_db()
+    return job
+
+
+def claim_job(job_id):
+    """Переводит задачу в работу, если её ещё не взял другой воркер."""
+    return ExportJob.objects.filter(
+        pk=job_id, status=Status.PENDING,
+    ).update(status=Status.RUNNING, started_at=timezone.now()) == 1
+
+
+def claim_pending_jobs(limit):
+    """Захватывает до limit задач из очереди в порядке поступления."""
+    candidates = ExportJob.objects.filter(
+        status=Status.PENDING).values_list('pk', flat=True)[:limit]
+    return [job_id for job_id in candidates if claim_job(job_id)]
+
+
+def run_job(job_id):
+    """
+    Выполняет захваченную задачу и сохраняет результат или ошибку.
+
+    Корзина могла измениться после постановки в очередь, поэтому ключ
+    вычисляется заново в момент построения. Документ кэшируется, только
+    если ключ не изменился и за время построения; задача получает ключ
+    того состояния корзины, по которому построен её результат.
+    """
+    job = ExportJob.objects.select_related('user').get(pk=job_id)
+    fields = {}
+    try:
+        key = get_cart_export_key(job.user, job.export_format, job.detailed)
+        content = render_export(
+            job.user, job.export_format, job.detailed)
+    except Exception as error:
+        fields.update(status=Status.FAILED, error=repr(error))
+    else:
+        if key == get_cart_export_key(
+                job.user, job.export_format, job.detailed):
+            export_cache.set(key, content)
+        fields.update(status=Status.DONE, result=content, key=key)
+    now = timezone.now()
+    fields.update(
+        finished_at=now,
+        expires_at=now + timedelta(seconds=settings.EXPORT_JOB_TTL))
+    ExportJob.objects.filter(pk=job_id).update(**fields)
+
+
+def run_job_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+def requeue_stale_jobs():
+    """Возвращает в очередь задачи, зависшие после падения воркера."""
+    deadline = timezone.now() - timedelta(
+        seconds=settings.EXPORT_JOB_TIMEOUT)
+    return ExportJob.objects.filter(
+        status=Status.RUNNING, started_at__lt=deadline,
+    ).update(status=Status.PENDING, started_at=None)
+
+
+def purge_expired_jobs():
+    """Удаляет задачи, срок хранения результата которых истёк."""
+    deleted, _ = ExportJob.objects.filter(
+        expires_at__lte=timezone.now()).delete()
+    return deleted
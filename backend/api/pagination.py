@@ -1,6 +1,21 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from recipes.constants import MAX_PAGE_SIZE, PAGE_SIZE
 
 
 class SetPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = 6
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Пагинация ленты рецептов по курсору.
+    Не выполняет COUNT(*) и OFFSET: следующая страница начинается
+    с позиции (pub_date, id) последнего рецепта текущей.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = PAGE_SIZE
+    max_page_size = MAX_PAGE_SIZE
+    ordering = ('-pub_date', '-id')
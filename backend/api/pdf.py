@@ -0,0 +1,110 @@
+"""
+Выгрузка списка покупок в PDF.
+"""
+import os
+import threading
+from tempfile import SpooledTemporaryFile
+
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from .shopping_list import format_ingredient, group_by_recipe
+
+PDF_FONT_NAME = 'DejaVuSans'
+PDF_FONT_PATH = os.path.join(
+    os.path.dirname(__file__), 'fonts', 'DejaVuSans.ttf')
+
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 15
+PDF_MARGIN = 50
+PDF_SPOOL_SIZE = 1024 * 1024
+
+_font_lock = threading.Lock()
+_font_registered = False
+
+
+def register_pdf_font():
+    """
+    Регистрирует шрифт с кириллицей, поставляемый вместе с приложением.
+    Файл шрифта разбирается один раз на процесс, при первой выгрузке;
+    возвращает имя шрифта для canvas.setFont.
+    """
+    global _font_registered
+    if not _font_registered:
+        with _font_lock:
+            if not _font_registered:
+                pdfmetrics.registerFont(
+                    TTFont(PDF_FONT_NAME, PDF_FONT_PATH))
+                _font_registered = True
+    return PDF_FONT_NAME
+
+
+class ShoppingListPDF:
+    """
+    Многостраничный PDF со списком покупок: при нехватке места
+    начинается новая страница с тем же заголовком и номером страницы.
+    """
+    title = 'Список покупок'
+
+    def __init__(self, output):
+        self.font = register_pdf_font()
+        self.width, self.height = letter
+        self.canvas = canvas.Canvas(output, pagesize=letter)
+        self.page = 0
+        self.start_page()
+
+    def start_page(self):
+        self.page += 1
+        self.canvas.setFont(self.font, PDF_FONT_SIZE + 2)
+        self.canvas.drawString(
+            PDF_MARGIN, self.height - PDF_MARGIN, f'{self.title}:')
+        self.canvas.setFont(self.font, PDF_FONT_SIZE - 2)
+        self.canvas.drawRightString(
+            self.width - PDF_MARGIN, PDF_MARGIN / 2,
+            f'Страница {self.page}')
+        self.canvas.setFont(self.font, PDF_FONT_SIZE)
+        self.y = self.height - PDF_MARGIN - 2 * PDF_LINE_HEIGHT
+
+    def line(self, text, indent=0):
+        """Выводит строку, перенося её по ширине страницы."""
+        x = PDF_MARGIN + indent
+        for part in simpleSplit(text, self.font, PDF_FONT_SIZE,
+                                self.width - PDF_MARGIN - x):
+            if self.y < PDF_MARGIN:
+                self.canvas.showPage()
+                self.start_page()
+            self.canvas.drawString(x, self.y, part)
+            self.y -= PDF_LINE_HEIGHT
+
+    def skip(self):
+        self.y -= PDF_LINE_HEIGHT / 2
+
+    def save(self):
+        self.canvas.showPage()
+        self.canvas.save()
+
+
+def render_pdf(ingredients, breakdown=None):
+    """
+    Рисует список покупок и возвращает файл, открытый на чтение с начала.
+    Документ до 1 МБ остаётся в памяти, больший — сбрасывается на диск.
+    """
+    output = SpooledTemporaryFile(max_size=PDF_SPOOL_SIZE)
+    document = ShoppingListPDF(output)
+    for ingredient in ingredients:
+        document.line(format_ingredient(
+            ingredient['ingredient__name'], ingredient['total_amount'],
+            ingredient['ingredient__measurement_unit']), indent=20)
+    for recipe_name, rows in group_by_recipe(breakdown):
+        document.skip()
+        document.line(f'Рецепт: {recipe_name}')
+        for row in rows:
+            document.line(format_ingredient(
+                row['ingredient__name'], row['amount'],
+                row['ingredient__measurement_unit']), indent=20)
+    document.save()
+    output.seek(0)
+    return output
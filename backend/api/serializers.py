@@ -1,9 +1,12 @@
-import base64
 import logging
 
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from django.core.files.base import File
+from django.core.files.uploadedfile import UploadedFile
 from django.core.validators import EmailValidator, RegexValidator
+from django.db import transaction
+from django.http import QueryDict
+from django.urls import reverse
 
 from djoser.serializers import UserCreateSerializer as DjoserSerializer
 from djoser.serializers import UserSerializer
@@ -14,9 +17,11 @@ from recipes.constants import (
     MAX_LENGTH,
     MAX_LENGTH_EMAIL,
     MAX_LENGTH_ROLE,
+    MAX_RELATION_BATCH,
     USERNAME_SEARCH_REGEX,
 )
 from recipes.models import (
+    ExportJob,
     FavoriteRecipe,
     Ingredient,
     IngredientInRecipe,
@@ -26,6 +31,12 @@ from recipes.models import (
     Subscription,
     Tag,
 )
+from recipes.images import image_srcset
+from recipes.versions import bump_recipes
+
+from .cache import cache_recipe, get_cached_recipes, recipe_cache_keys
+from .uploads import (check_upload_size, close_upload, decode_data_url,
+                      normalize_form_data, verify_image)
 
 logger = logging.getLogger(__name__)
 
@@ -37,14 +48,15 @@ class Base64ImageField(serializers.ImageField):
         if not data:
             return None
         if isinstance(data, str) and data.startswith('data:image'):
-            try:
-                format, imgstr = data.split(';base64,')
-                ext = format.split('/')[-1]
-                data = ContentFile(base64.b64decode(
-                    imgstr), name=f'file.{ext}')
-            except (ValueError, TypeError) as e:
-                raise serializers.ValidationError(
-                    'Ошибка при декодировании изображения' + str(e))
+            # Изображение уже проверено по ходу декодирования, поэтому
+            # повторное открытие в ImageField с копией файла не нужно.
+            upload = verify_image(decode_data_url(data))
+            return serializers.FileField.to_internal_value(self, upload)
+        if isinstance(data, UploadedFile):
+            # Файл из multipart/form-data уже записан обработчиками
+            # загрузки Django в память или во временный файл.
+            upload = verify_image(check_upload_size(data))
+            return serializers.FileField.to_internal_value(self, upload)
         return super().to_internal_value(data)
 
 
@@ -73,15 +85,21 @@ class UserCreateSerializer(DjoserSerializer):
 
 class UserSerializer(UserSerializer):
     avatar = Base64ImageField(required=False, use_url=True)
+    avatar_srcset = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ('id', 'email', 'username',
                   'first_name', 'last_name', 'avatar',
-                  'is_subscribed')
+                  'avatar_srcset', 'is_subscribed')
+
+    def get_avatar_srcset(self, obj):
+        return image_srcset(obj.avatar, self.context.get('request'))
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Subscription.objects.filter(
@@ -101,12 +119,59 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+def resolve_pks(queryset, pks):
+    """
+    Загружает объекты по списку ключей одним запросом IN и сообщает
+    обо всех отсутствующих ключах сразу.
+    """
+    objects = queryset.in_bulk(pks)
+    missing = [pk for pk in dict.fromkeys(pks) if pk not in objects]
+    if missing:
+        raise serializers.ValidationError(
+            'Не найдены объекты с ID: '
+            + ', '.join(str(pk) for pk in missing) + '.')
+    return objects
+
+
+class BulkPrimaryKeyRelatedField(serializers.Field):
+    """
+    Список первичных ключей. В отличие от PrimaryKeyRelatedField
+    с many=True, все ключи разрешаются одним запросом.
+    """
+    default_error_messages = {
+        'not_a_list': 'Ожидался список ID, получен {input_type}.',
+        'empty': 'Список не может быть пустым.',
+        'incorrect_type': 'Некорректный ID: {value}.',
+    }
+
+    def __init__(self, queryset, allow_empty=True, **kwargs):
+        self.queryset = queryset
+        self.allow_empty = allow_empty
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, (str, dict)) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not data and not self.allow_empty:
+            self.fail('empty')
+        pks = []
+        for value in data:
+            try:
+                pks.append(int(value))
+            except (TypeError, ValueError):
+                self.fail('incorrect_type', value=value)
+        objects = resolve_pks(self.queryset.all(), pks)
+        return [objects[pk] for pk in pks]
+
+    def to_representation(self, value):
+        return [obj.pk for obj in value.all()]
+
+
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
     """
     Сериализатор для промежуточной модели IngredientInRecipe.
     """
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all())
+    id = serializers.ReadOnlyField(source='ingredient_id')
     name = serializers.CharField(
         source='ingredient.name', read_only=True)
     measurement_unit = serializers.CharField(
@@ -118,6 +183,29 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'measurement_unit',
                   'amount']
 
+
+class IngredientAmountListSerializer(serializers.ListSerializer):
+    """Разрешает ID всех ингредиентов рецепта одним запросом."""
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = resolve_pks(
+            Ingredient.objects.all(), [item['id'] for item in items])
+        for item in items:
+            item['id'] = ingredients[item['id']]
+        return items
+
+
+class IngredientAmountSerializer(serializers.Serializer):
+    """
+    Ингредиент рецепта при записи: ID ингредиента и количество.
+    """
+    id = serializers.IntegerField()
+    amount = serializers.IntegerField()
+
+    class Meta:
+        list_serializer_class = IngredientAmountListSerializer
+
     def validate_amount(self, value):
         """
         Проверка количества ингредиента.
@@ -132,13 +220,12 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     """
     Сериализатор для рецептов.
     """
-    ingredients = IngredientInRecipeSerializer(many=True,
-                                               required=True,
-                                               allow_null=False,
-                                               allow_empty=False)
-    tags = serializers.PrimaryKeyRelatedField(
+    ingredients = IngredientAmountSerializer(many=True,
+                                             required=True,
+                                             allow_null=False,
+                                             allow_empty=False)
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
-        many=True,
         required=True,
         allow_null=False,
         allow_empty=False)
@@ -179,6 +266,11 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         return ShoppingCart.objects.filter(user=request.user,
                                            recipe=obj).exists()
 
+    def to_internal_value(self, data):
+        if isinstance(data, QueryDict):
+            data = normalize_form_data(data, ('tags', 'ingredients'))
+        return super().to_internal_value(data)
+
     def validate(self, data):
         """
         Проверка, что поля tags и ingredients переданы и не пустые.
@@ -248,9 +340,10 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         if not value:
             raise serializers.ValidationError(
                 'Изображение должно быть предоставлено.')
-        if not isinstance(value, ContentFile):
+        if not isinstance(value, File):
             raise serializers.ValidationError(
-                'Изображение должно быть в формате base64.')
+                'Изображение должно быть в формате base64 '
+                'или файлом multipart/form-data.')
         return value
 
     def create_tags_and_ingredients(self, recipe, tags, ingredients):
@@ -258,21 +351,18 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         Создание записей в промежуточных моделях RecipeTag и IngredientInRecipe
         в одном методе.
         """
-        if any(isinstance(tag, Tag) for tag in tags):
-            tags = [tag.id for tag in tags]
-        tags = Tag.objects.filter(id__in=tags)
         tag_objects = [RecipeTag(recipe=recipe, tag=tag) for tag in tags]
 
         ingredient_objects = [
             IngredientInRecipe(
                 recipe=recipe,
-                ingredient=dict(ingredient).get('id'),
-                amount=dict(ingredient).get(
-                    'amount')) for ingredient in ingredients
+                ingredient=ingredient['id'],
+                amount=ingredient['amount']) for ingredient in ingredients
         ]
 
         RecipeTag.objects.bulk_create(tag_objects)
         IngredientInRecipe.objects.bulk_create(ingredient_objects)
+        bump_recipes([recipe.pk])
 
     def create(self, validated_data):
         """
@@ -286,9 +376,11 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
         validated_data.pop('author', None)
 
-        recipe = Recipe.objects.create(author=user, **validated_data)
-
-        self.create_tags_and_ingredients(recipe, tags, ingredients)
+        # Изображение сохраняется в той же транзакции, что и рецепт:
+        # до её фиксации файл не может быть удалён (recipes.storage).
+        with transaction.atomic():
+            recipe = Recipe.objects.create(author=user, **validated_data)
+            self.create_tags_and_ingredients(recipe, tags, ingredients)
 
         return recipe
 
@@ -296,25 +388,92 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         """
         Переопределение метода update
         для обновления рецепта с тегами и ингредиентами.
+        Связи не пересоздаются: добавляются, удаляются и
+        обновляются только изменившиеся строки.
         """
         ingredients_data = validated_data.pop('ingredients', None)
         tags_data = validated_data.pop('tags', None)
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        with transaction.atomic():
+            if validated_data:
+                for attr, value in validated_data.items():
+                    setattr(instance, attr, value)
+                instance.save()
 
-        if ingredients_data is not None or tags_data is not None:
-            RecipeTag.objects.filter(recipe=instance).delete()
-            instance.ingredient_amounts.all().delete()
+            changed = False
+            if tags_data is not None:
+                changed |= self.sync_tags(instance, tags_data)
+            if ingredients_data is not None:
+                changed |= self.sync_ingredients(instance, ingredients_data)
+            if changed:
+                bump_recipes([instance.pk])
 
-            self.create_tags_and_ingredients(
-                instance, tags_data or [], ingredients_data or [])
+        return instance
 
+    def sync_tags(self, recipe, tags):
+        """Приводит теги рецепта к переданным. Возвращает, были ли правки."""
+        current = set(RecipeTag.objects.filter(
+            recipe=recipe).values_list('tag_id', flat=True))
+        wanted = {tag.id for tag in tags}
+        if current - wanted:
+            RecipeTag.objects.filter(
+                recipe=recipe, tag_id__in=current - wanted).delete()
+        if wanted - current:
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag_id=tag_id)
+                for tag_id in wanted - current)
+        return current != wanted
+
+    def sync_ingredients(self, recipe, ingredients):
+        """
+        Приводит ингредиенты рецепта к переданным: изменившиеся
+        количества обновляются одним bulk_update.
+        """
+        current = {
+            row.ingredient_id: row
+            for row in recipe.ingredient_amounts.only(
+                'id', 'ingredient_id', 'amount')
+        }
+        wanted = {item['id'].id: item['amount'] for item in ingredients}
+
+        removed = current.keys() - wanted.keys()
+        if removed:
+            IngredientInRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed).delete()
+        changed_rows = []
+        for ingredient_id, row in current.items():
+            amount = wanted.get(ingredient_id)
+            if amount is not None and row.amount != amount:
+                row.amount = amount
+                changed_rows.append(row)
+        if changed_rows:
+            IngredientInRecipe.objects.bulk_update(changed_rows, ['amount'])
+        added = wanted.keys() - current.keys()
+        if added:
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                                   amount=wanted[ingredient_id])
+                for ingredient_id in added)
+        return bool(removed or changed_rows or added)
+
+    def save(self, **kwargs):
+        instance = super().save(**kwargs)
+        close_upload(self.validated_data.get('image'))
         return instance
 
     def to_representation(self, instance):
-        return RecipeGetSerializer(instance).data
+        return RecipeGetSerializer(instance, context=self.context).data
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """
+    Загружает закэшированные представления всей страницы
+    рецептов одним обращением к кэшу.
+    """
+    def to_representation(self, data):
+        recipes = list(data)
+        self.child.load_cached(recipes)
+        return super().to_representation(recipes)
 
 
 class RecipeGetSerializer(serializers.ModelSerializer):
@@ -325,6 +484,7 @@ class RecipeGetSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer(read_only=True)
     image = Base64ImageField(read_only=True)
+    image_srcset = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -335,13 +495,54 @@ class RecipeGetSerializer(serializers.ModelSerializer):
                   'text',
                   'cooking_time',
                   'image',
+                  'image_srcset',
                   'author',
                   'tags',
                   'ingredients',
                   'is_favorited',
                   'is_in_shopping_cart']
+        list_serializer_class = RecipeListSerializer
+
+    def get_cache_scope(self):
+        request = self.context.get('request')
+        return request.get_host() if request else ''
+
+    def load_cached(self, recipes):
+        self._cache_keys = recipe_cache_keys(
+            [recipe.pk for recipe in recipes], self.get_cache_scope())
+        self._cached = get_cached_recipes(self._cache_keys.values())
+
+    def to_representation(self, instance):
+        """
+        Берёт общую часть представления из кэша и дополняет её
+        флагами текущего пользователя.
+        """
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        keys = getattr(self, '_cache_keys', {})
+        key = keys.get(instance.pk)
+        if key is None:
+            key = recipe_cache_keys(
+                [instance.pk], self.get_cache_scope())[instance.pk]
+            data = get_cached_recipes([key]).get(key)
+        else:
+            data = self._cached.get(key)
+        if data is None:
+            data = super().to_representation(instance)
+            cache_recipe(key, data)
+            return data
+        data['is_favorited'] = self.get_is_favorited(instance)
+        data['is_in_shopping_cart'] = self.get_is_in_shopping_cart(instance)
+        data['author']['is_subscribed'] = (
+            self.fields['author'].get_is_subscribed(instance.author))
+        return data
+
+    def get_image_srcset(self, obj):
+        return image_srcset(obj.image, self.context.get('request'))
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and FavoriteRecipe.objects.filter(
@@ -349,6 +550,8 @@ class RecipeGetSerializer(serializers.ModelSerializer):
                     recipe=obj).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (request and request.user.is_authenticated
                 and ShoppingCart.objects.filter(
@@ -359,17 +562,29 @@ class RecipeGetSerializer(serializers.ModelSerializer):
 class RecipeShortSerializer(serializers.ModelSerializer):
 
     image = Base64ImageField(required=True)
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
+
+    def get_image_srcset(self, obj):
+        return image_srcset(obj.image, self.context.get('request'))
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список ID рецептов для пакетных операций."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_RELATION_BATCH)
 
 
 class SubscriptionUserSerializer(serializers.ModelSerializer):
 
     is_subscribed = serializers.SerializerMethodField()
+    avatar_srcset = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -381,23 +596,47 @@ class SubscriptionUserSerializer(serializers.ModelSerializer):
                   'is_subscribed',
                   'recipes',
                   'recipes_count',
-                  'avatar')
+                  'avatar',
+                  'avatar_srcset')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Subscription.objects.filter(
                 user=request.user, author=obj).exists()
         return False
 
+    def get_avatar_srcset(self, obj):
+        return image_srcset(obj.avatar, self.context.get('request'))
+
     def get_recipes(self, obj):
+        """
+        Использует рецепты, заранее загруженные
+        attach_recent_recipes для всей страницы.
+        """
+        if hasattr(obj, 'recent_recipes'):
+            recipes = obj.recent_recipes
+        else:
+            recipes = Recipe.objects.filter(author=obj)
+        return RecipeShortSerializer(
+            recipes, many=True, context=self.context).data
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+
+    format = serializers.CharField(source='export_format')
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = ('id', 'status', 'format', 'detailed', 'error',
+                  'created', 'finished_at', 'expires_at', 'download_url')
+
+    def get_download_url(self, obj):
+        if obj.status != ExportJob.Status.DONE:
+            return None
+        url = reverse('api:export-job-download', args=(obj.pk,))
         request = self.context.get('request')
-        recipes_limit = request.query_params.get(
-            'recipes_limit') if request else None
-        recipes = Recipe.objects.filter(author=obj)
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
-        return RecipeShortSerializer(recipes, many=True).data
-
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
+        return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,150 @@
+"""
+Список покупок пользователя.
+
+Обе выборки выполняются одним запросом независимо от того,
+сколько рецептов в корзине. Текстовые форматы выгрузки строятся
+построчно прямо из выборок и отдаются потоком.
+"""
+import csv
+import hashlib
+import json
+from itertools import groupby
+from operator import itemgetter
+
+from django.db.models import Sum
+
+from recipes.models import IngredientInRecipe, ShoppingCart
+from recipes.versions import get_versions, recipe_key
+
+
+def get_cart_export_key(user, export_format, detailed):
+    """
+    Ключ выгрузки: меняется вместе с составом корзины и версиями
+    входящих в неё рецептов (а значит, и их ингредиентов).
+    """
+    recipe_ids = sorted(ShoppingCart.objects.filter(
+        user=user).values_list('recipe_id', flat=True))
+    versions = get_versions(recipe_key(pk) for pk in recipe_ids)
+    cart_version = hashlib.sha1(';'.join(
+        f'{pk}:{versions[recipe_key(pk)]}' for pk in recipe_ids
+    ).encode()).hexdigest()
+    return f'export:{user.pk}:{export_format}:{int(detailed)}:{cart_version}'
+
+
+def get_cart_ingredients(user):
+    """
+    Ингредиенты всех рецептов из корзины, сгруппированные
+    по названию и единице измерения, с суммарным количеством.
+    """
+    return (
+        IngredientInRecipe.objects
+        .filter(recipe__in_cart__user=user)
+        .values('ingredient__name', 'ingredient__measurement_unit')
+        .annotate(total_amount=Sum('amount'))
+        .order_by('ingredient__name')
+    )
+
+
+def get_cart_breakdown(user):
+    """Ингредиенты корзины по рецептам, упорядоченные по рецептам."""
+    return (
+        IngredientInRecipe.objects
+        .filter(recipe__in_cart__user=user)
+        .values('recipe_id', 'recipe__name', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount')
+        .order_by('recipe__name', 'recipe_id', 'ingredient__name')
+    )
+
+
+def format_ingredient(name, amount, measurement_unit):
+    return f'- {name}: {amount} {measurement_unit}'
+
+
+def group_by_recipe(breakdown):
+    """Группирует строки get_cart_breakdown по рецептам."""
+    for (_, recipe_name), rows in groupby(
+            breakdown or (), key=itemgetter('recipe_id', 'recipe__name')):
+        yield recipe_name, rows
+
+
+def iter_text(ingredients, breakdown=None):
+    yield 'Список покупок:\n'
+    for ingredient in ingredients:
+        yield format_ingredient(
+            ingredient['ingredient__name'], ingredient['total_amount'],
+            ingredient['ingredient__measurement_unit']) + '\n'
+    for recipe_name, rows in group_by_recipe(breakdown):
+        yield f'\nРецепт: {recipe_name}\n'
+        for row in rows:
+            yield format_ingredient(
+                row['ingredient__name'], row['amount'],
+                row['ingredient__measurement_unit']) + '\n'
+
+
+class Echo:
+    """Файлоподобный объект для csv.writer, возвращающий строку."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(ingredients, breakdown=None):
+    """
+    CSV с колонками name, measurement_unit, amount; при разбивке
+    по рецептам — строки рецептов с дополнительной колонкой recipe.
+    """
+    writer = csv.writer(Echo())
+    if breakdown is None:
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient['ingredient__name'],
+                ingredient['ingredient__measurement_unit'],
+                ingredient['total_amount']))
+        return
+    yield writer.writerow(('recipe', 'name', 'measurement_unit', 'amount'))
+    for row in breakdown:
+        yield writer.writerow((
+            row['recipe__name'], row['ingredient__name'],
+            row['ingredient__measurement_unit'], row['amount']))
+
+
+def iter_json(ingredients, breakdown=None):
+    """
+    JSON-объект {"ingredients": [...]} и, при разбивке по рецептам,
+    "recipes": [{"name": ..., "ingredients": [...]}].
+    """
+    yield '{"ingredients": ['
+    for number, ingredient in enumerate(ingredients):
+        yield (',' if number else '') + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+            'amount': ingredient['total_amount'],
+        }, ensure_ascii=False)
+    yield ']'
+    if breakdown is not None:
+        yield ', "recipes": ['
+        for number, (recipe_name, rows) in enumerate(
+                group_by_recipe(breakdown)):
+            yield (',' if number else '') + json.dumps({
+                'name': recipe_name,
+                'ingredients': [{
+                    'name': row['ingredient__name'],
+                    'measurement_unit': row['ingredient__measurement_unit'],
+                    'amount': row['amount'],
+                } for row in rows],
+            }, ensure_ascii=False)
+        yield ']'
+    yield '}'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (iter_text, 'text/plain; charset=utf-8'),
+    'csv': (iter_csv, 'text/csv; charset=utf-8'),
+    'json': (iter_json, 'application/json'),
+}
+SHOPPING_LIST_CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    **{name: content_type
+       for name, (_, content_type) in SHOPPING_LIST_FORMATS.items()},
+}
@@ -0,0 +1,185 @@
+"""
+Загрузка изображений: потоковое декодирование data URL и проверка
+файлов, пришедших частями multipart/form-data.
+
+Строка base64 декодируется частями прямо в загружаемый файл Django:
+небольшие изображения остаются в памяти, крупные (больше
+FILE_UPLOAD_MAX_MEMORY_SIZE) пишутся во временный файл, который
+хранилище затем перемещает, а не копирует. Заявленный размер
+проверяется до декодирования, а формат и размеры изображения — по
+первой части, до декодирования остального.
+"""
+import base64
+import binascii
+import json
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile,
+                                            UploadedFile)
+from PIL import Image, ImageFile
+from rest_framework import serializers
+
+from recipes.constants import MAX_IMAGE_SIDE
+
+DECODE_CHUNK_SIZE = 64 * 1024 * 4
+# Переводы строк и пробелы в base64 (MIME, Android Base64.DEFAULT)
+# пропускаются, как это делал b64decode без validate.
+WHITESPACE = ' \t\r\n'
+STRIP_WHITESPACE = str.maketrans('', '', WHITESPACE)
+HEADER_SEARCH_LIMIT = 100
+IMAGE_FORMATS = {
+    'jpeg': 'JPEG',
+    'jpg': 'JPEG',
+    'png': 'PNG',
+    'gif': 'GIF',
+    'webp': 'WEBP',
+}
+
+
+def decoded_size(data, start):
+    """Размер данных после декодирования, без самого декодирования."""
+    length = len(data) - start - sum(
+        data.count(char, start) for char in WHITESPACE)
+    tail = data[max(start, len(data) - HEADER_SEARCH_LIMIT):]
+    return length // 4 * 3 - tail.rstrip(WHITESPACE)[-2:].count('=')
+
+
+def check_image_header(chunk, image_format):
+    """Разбирает заголовок изображения по первой части данных."""
+    parser = ImageFile.Parser()
+    try:
+        parser.feed(chunk)
+    except Exception:
+        parser.image = None
+    image = parser.image
+    if image is None:
+        raise serializers.ValidationError(
+            'Не удалось распознать изображение.')
+    if image.format != image_format:
+        raise serializers.ValidationError(
+            'Формат изображения не совпадает с заявленным.')
+    if max(image.size) > MAX_IMAGE_SIDE:
+        raise serializers.ValidationError(
+            f'Размер изображения не должен превышать '
+            f'{MAX_IMAGE_SIDE} пикселей по каждой стороне.')
+    return image
+
+
+def decode_data_url(data, name='file'):
+    """
+    Декодирует data:image/<формат>;base64,... в загруженный файл.
+    """
+    separator = data.find(';base64,', 0, HEADER_SEARCH_LIMIT)
+    if separator == -1:
+        raise serializers.ValidationError(
+            'Ошибка при декодировании изображения: нет данных base64.')
+    extension = data[len('data:image/'):separator].lower()
+    image_format = IMAGE_FORMATS.get(extension)
+    if image_format is None:
+        raise serializers.ValidationError(
+            f'Неподдерживаемый формат изображения: {extension}.')
+
+    start = separator + len(';base64,')
+    size = decoded_size(data, start)
+    if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise serializers.ValidationError(
+            f'Размер изображения не должен превышать '
+            f'{settings.IMAGE_UPLOAD_MAX_SIZE // (1024 * 1024)} МБ.')
+
+    content_type = f'image/{image_format.lower()}'
+    file_name = f'{name}.{extension}'
+    if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        upload = TemporaryUploadedFile(
+            file_name, content_type, size, None)
+    else:
+        upload = InMemoryUploadedFile(
+            BytesIO(), None, file_name, content_type, size, None)
+    try:
+        # Декодируются только части длиной, кратной 4; остаток
+        # переносится в следующую часть.
+        pending = ''
+        for offset in range(start, len(data), DECODE_CHUNK_SIZE):
+            part = pending + data[
+                offset:offset + DECODE_CHUNK_SIZE].translate(STRIP_WHITESPACE)
+            aligned = len(part) - len(part) % 4
+            pending = part[aligned:]
+            if not aligned:
+                continue
+            chunk = base64.b64decode(part[:aligned], validate=True)
+            if not upload.file.tell():
+                check_image_header(chunk, image_format)
+            upload.file.write(chunk)
+        if pending:
+            base64.b64decode(pending, validate=True)
+    except (binascii.Error, ValueError) as error:
+        upload.close()
+        raise serializers.ValidationError(
+            'Ошибка при декодировании изображения: ' + str(error))
+    except serializers.ValidationError:
+        upload.close()
+        raise
+    upload.size = upload.file.tell()
+    upload.seek(0)
+    return upload
+
+
+def verify_image(upload):
+    """
+    Проверяет изображение целиком, читая файл на месте,
+    и отмечает его тип, как это делает forms.ImageField.
+    """
+    try:
+        image = Image.open(upload)
+        image.verify()
+    except Exception:
+        raise serializers.ValidationError(
+            'Загрузите корректное изображение.')
+    finally:
+        upload.seek(0)
+    upload.image = image
+    upload.content_type = Image.MIME.get(image.format)
+    return upload
+
+
+def close_upload(value):
+    """
+    Закрывает декодированный файл после сохранения. Временный файл к
+    этому моменту уже перемещён хранилищем, и закрывать его должен
+    TemporaryUploadedFile, а не сборщик мусора.
+    """
+    if isinstance(value, UploadedFile):
+        value.close()
+
+
+def check_upload_size(upload):
+    if upload.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise serializers.ValidationError(
+            f'Размер изображения не должен превышать '
+            f'{settings.IMAGE_UPLOAD_MAX_SIZE // (1024 * 1024)} МБ.')
+    return upload
+
+
+def normalize_form_data(data, list_fields):
+    """
+    Приводит QueryDict формы к виду JSON-запроса. Поля-списки можно
+    передать повторяющимися частями (tags=1, tags=2) или одной частью
+    со списком JSON; элементы-объекты передаются в JSON.
+    """
+    result = {key: data[key] for key in data if key not in list_fields}
+    for field in list_fields:
+        if field not in data:
+            continue
+        items = []
+        for value in data.getlist(field):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+            if isinstance(value, list):
+                items.extend(value)
+            else:
+                items.append(value)
+        result[field] = items
+    return result
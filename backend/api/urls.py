@@ -1,7 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from .views import (ExportJobViewSet, IngredientViewSet, RecipeViewSet,
+                    TagViewSet, UserViewSet)
 
 app_name = 'api'
 
@@ -15,6 +16,8 @@ router.register(r'tags', TagViewSet,
                 basename='tag')
 router.register(r'ingredients', IngredientViewSet,
                 basename='ingredient')
+router.register(r'export-jobs', ExportJobViewSet,
+                basename='export-job')
 
 urlpatterns = [
     path('', include(router.urls)),
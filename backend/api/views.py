@@ -1,28 +1,34 @@
+import hashlib
 import os
-from io import BytesIO
-
-import requests
-import short_url
+from collections import defaultdict
 
 from django.contrib.auth import get_user_model
-from django.http import Http404, HttpResponse
-from django.shortcuts import get_object_or_404, redirect
+from django.db import transaction
+from django.db.models import (Exists, F, OuterRef, Prefetch, Value,
+                              Window)
+from django.db.models.functions import RowNumber
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseRedirect, StreamingHttpResponse)
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
 from djoser.views import UserViewSet as DjoserViewSet
 from django_filters.rest_framework import DjangoFilterBackend
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 from rest_framework.pagination import LimitOffsetPagination
 
-from recipes.constants import FreeSans_Link
 from recipes.models import (
+    ExportJob,
     FavoriteRecipe,
     Ingredient,
     IngredientInRecipe,
@@ -31,38 +37,110 @@ from recipes.models import (
     Subscription,
     Tag,
 )
+from recipes.constants import MAX_ID, SHORT_LINK_REDIRECT_MAX_AGE
+from recipes.relations import add_relations, remove_relations
+from recipes.short_links import (decode_short_code, hit_counter,
+                                 recipe_exists, short_code)
+from recipes.versions import get_versions, recipe_key, table_key, user_key
 
+from .export_cache import export_cache, read_chunks
 from .filters import RecipeFilter
-from .pagination import SetPagination
+from .ingredient_index import ingredient_index
+from .jobs import enqueue_export
+from .pagination import RecipeCursorPagination, SetPagination
+from .pdf import render_pdf
 from .permissions import IsAuthorOrAdmin
+from .renderers import CSVRenderer, PDFRenderer, PlainTextRenderer
 from .serializers import (
     Base64ImageField,
+    ExportJobSerializer,
     UserSerializer,
     IngredientSerializer,
     RecipeCreateSerializer,
     RecipeGetSerializer,
+    RecipeIdsSerializer,
     RecipeShortSerializer,
     SubscriptionUserSerializer,
     TagSerializer,
 )
+from .shopping_list import (SHOPPING_LIST_CONTENT_TYPES,
+                            SHOPPING_LIST_FORMATS, get_cart_breakdown,
+                            get_cart_export_key, get_cart_ingredients)
+from .uploads import close_upload
 
 User = get_user_model()
 
+# Изображения принимаются и в base64 внутри JSON, и файлом формы.
+UPLOAD_PARSER_CLASSES = [JSONParser, MultiPartParser, FormParser]
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+def query_flag(request, name):
+    """Читает логический параметр запроса: detailed=0 или false — ложь."""
+    return request.query_params.get(name, '').strip().lower() in TRUE_VALUES
 
-def generate_short_link(request, recipe_id):
-    short_code = short_url.encode_url(recipe_id)
 
+def generate_short_link(request, recipe_id):
     base_url = request.build_absolute_uri('/')[:-1]
-    return f"{base_url}/s/{short_code}"
+    return f"{base_url}/s/{short_code(recipe_id)}"
 
 
 def redirect_to_recipe(request, s):
-    try:
-        pk = short_url.decode_url(s)
-        recipe = get_object_or_404(Recipe, pk=pk)
-        return redirect(f'/recipes/{recipe.pk}/')
-    except ValueError:
+    """
+    Переход по короткой ссылке без чтения рецепта из базы;
+    переход учитывается в счётчике hit_counter.
+    """
+    pk = decode_short_code(s)
+    if pk is None or not recipe_exists(pk):
         raise Http404("Неверный короткий URL")
+    hit_counter.record(pk)
+    response = HttpResponseRedirect(f'/recipes/{pk}/')
+    patch_cache_control(
+        response, public=True, max_age=SHORT_LINK_REDIRECT_MAX_AGE)
+    return response
+
+
+def attach_recent_recipes(authors, recipes_limit=None):
+    """
+    Загружает последние рецепты сразу всех авторов одним запросом:
+    при заданном recipes_limit рецепты нумеруются
+    ROW_NUMBER() OVER (PARTITION BY author_id) и отбираются
+    первые recipes_limit у каждого автора.
+    """
+    recipes = Recipe.objects.filter(author__in=authors).only(
+        'id', 'name', 'image', 'cooking_time', 'author_id')
+    if recipes_limit is not None:
+        ranked = recipes.annotate(recipe_rank=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=(F('pub_date').desc(), F('id').desc()),
+        )).order_by()
+        sql, params = ranked.query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) ranked_recipes '
+            f'WHERE recipe_rank <= %s ORDER BY author_id, recipe_rank',
+            (*params, recipes_limit))
+    recipes_by_author = defaultdict(list)
+    for recipe in recipes:
+        recipes_by_author[recipe.author_id].append(recipe)
+    for author in authors:
+        author.recent_recipes = recipes_by_author[author.pk]
+
+
+def cache_stream(key, chunks):
+    """
+    Отдаёт части документа и по ходу дописывает их в кэш выгрузок.
+    Если отдача прервана, недописанный документ в кэш не попадает.
+    """
+    writer = export_cache.writer(key)
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+            yield chunk
+        writer.commit()
+    finally:
+        writer.abort()
 
 
 class UserViewSet(DjoserViewSet):
@@ -76,7 +154,8 @@ class UserViewSet(DjoserViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['put', 'delete'], url_path='me/avatar',
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            parser_classes=UPLOAD_PARSER_CLASSES)
     def avatar(self, request):
         user = request.user
 
@@ -84,48 +163,65 @@ class UserViewSet(DjoserViewSet):
             avatar = request.data.get('avatar')
             if avatar:
                 try:
-                    user.avatar = Base64ImageField().to_internal_value(avatar)
-                    user.save()
+                    upload = Base64ImageField().to_internal_value(avatar)
+                    user.avatar = upload
+                    # Файл не удалят, пока ссылка на него
+                    # не зафиксирована (recipes.storage).
+                    with transaction.atomic():
+                        user.save()
+                    close_upload(upload)
                     serializer = UserSerializer(user)
                     return Response(serializer.data,
                                     status=status.HTTP_200_OK)
                 except ValidationError as e:
-                    return Response({"detail": str(e)},
+                    return Response({"detail": e.detail[0]},
                                     status=status.HTTP_400_BAD_REQUEST)
             return Response(
                 {"detail": "Файл 'avatar' не найден."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        user.avatar.delete(save=True)
+        # Файл может использоваться другими записями, его удалит
+        # сигнал, когда ссылок на него не останется.
+        user.avatar = None
         user.save()
         serializer = UserSerializer(user)
         return Response(serializer.data, status=status.HTTP_204_NO_CONTENT)
 
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit is None:
+            return None
+        try:
+            recipes_limit = int(recipes_limit)
+            if recipes_limit < 0:
+                raise ValueError
+        except ValueError:
+            raise ValidationError(
+                {"detail": "Неверное значение параметра 'recipes_limit'."})
+        return recipes_limit
+
+    def get_authors_queryset(self):
+        """
+        На странице подписок и в ответе subscribe
+        пользователь всегда подписан на авторов.
+        """
+        return User.objects.annotate(is_subscribed=Value(True))
+
     @action(detail=False, methods=['get'], url_path='subscriptions',
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        user = request.user
-        subscriptions = Subscription.objects.filter(
-            user=user).select_related('author')
-        page = self.paginate_queryset(subscriptions)
+        recipes_limit = self.get_recipes_limit()
+        authors = self.get_authors_queryset().filter(
+            following__user=request.user).order_by('following__id')
+        page = self.paginate_queryset(authors)
+        authors = list(authors if page is None else page)
+        attach_recent_recipes(authors, recipes_limit)
 
+        serializer = SubscriptionUserSerializer(
+            authors, many=True, context={'request': request})
         if page is not None:
-            authors_for_page = []
-            for subscription in page:
-                authors_for_page.append(subscription.author)
-
-            serializer = SubscriptionUserSerializer(
-                authors_for_page, many=True, context={'request': request})
             return self.get_paginated_response(serializer.data)
-
-        authors_for_subscriptions = []
-        for subscription in subscriptions:
-            authors_for_subscriptions.append(subscription.author)
-        serializer = SubscriptionUserSerializer(
-            authors_for_subscriptions,
-            many=True,
-            context={'request': request})
         return Response(serializer.data,
                         status=status.HTTP_200_OK)
 
@@ -137,29 +233,16 @@ class UserViewSet(DjoserViewSet):
         author = get_object_or_404(User, pk=id)
 
         if request.method == 'POST':
+            recipes_limit = self.get_recipes_limit()
 
             Subscription.objects.create(user=user, author=author)
 
-            recipes_limit = request.query_params.get('recipes_limit', None)
-            recipes = Recipe.objects.filter(author=author)
-            if recipes_limit:
-                try:
-                    recipes_limit = int(recipes_limit)
-                    recipes = recipes[:recipes_limit]
-                except ValueError:
-                    return Response(
-                        {"detail": "Неверное значение параметра"
-                                   " 'recipes_limit'."},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-
+            author = self.get_authors_queryset().get(pk=author.pk)
+            attach_recent_recipes([author], recipes_limit)
             serializer = SubscriptionUserSerializer(
                 author, context={'request': request})
-            response_data = serializer.data
-            response_data['recipes'] = RecipeShortSerializer(
-                recipes, many=True).data
 
-            return Response(response_data,
+            return Response(serializer.data,
                             status=status.HTTP_201_CREATED)
 
         subscription = Subscription.objects.filter(user=user,
@@ -175,31 +258,88 @@ class UserViewSet(DjoserViewSet):
             status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class ConditionalGetMixin:
+    """
+    Добавляет к ответам list и retrieve валидаторы ETag и Last-Modified
+    и отвечает 304 Not Modified без сериализации данных.
+    Валидаторы строятся из версий данных в базе (recipes.versions),
+    а для авторизованного пользователя включают версию его флагов.
+    По умолчанию используется версия таблицы модели queryset.
+    """
+    def get_version_keys(self):
+        return [table_key(self.queryset.model._meta.model_name + 's')]
+
+    def get_validators(self):
+        keys = self.get_version_keys()
+        if self.request.user.is_authenticated:
+            keys.append(user_key(self.request.user.pk))
+        versions = self.versions = get_versions(keys)
+        tag = ';'.join(f'{key}={versions[key]}' for key in keys)
+        etag = '"%s"' % hashlib.md5(tag.encode()).hexdigest()
+        # Версия 0 — данные ещё не менялись: дата изменения неизвестна.
+        last_modified = max(versions.values()) // 10 ** 9 or None
+        return etag, last_modified
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK,
+                                    status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, no_cache=True,
+                                private=request.user.is_authenticated)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs)
+
+
+class TagViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
-    queryset = Ingredient.objects.all()
+class IngredientViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
+    queryset = Ingredient.objects.order_by('name')
     serializer_class = IngredientSerializer
     pagination_class = None
 
-    def get_queryset(self):
-        query = self.request.query_params.get('name', None)
-
-        if query:
-            results_start = Ingredient.objects.filter(
-                name__istartswith=query)
-            results_contains = Ingredient.objects.filter(
-                name__icontains=query).exclude(
-                name__istartswith=query)
-            results = results_start | results_contains
-
-            return results.order_by('name')
-
-        return Ingredient.objects.all().order_by('name')
+    def list(self, request, *args, **kwargs):
+        """
+        Поиск по параметру name выполняется по индексу в памяти:
+        сначала совпадения по началу названия, затем по подстроке,
+        затем похожие названия. Параметр limit ограничивает выдачу.
+        """
+        if not request.query_params.get('name'):
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(self.search, request)
+
+    def search(self, request):
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+                if limit < 1:
+                    raise ValueError
+            except ValueError:
+                raise ValidationError(
+                    {"detail": "Неверное значение параметра 'limit'."})
+        # Индекс сверяется с той же версией, что вошла в ETag.
+        return Response(ingredient_index.search(
+            request.query_params['name'], limit,
+            version=self.versions[table_key('ingredients')]))
 
 
 class UserRecipeRelationMixin:
@@ -209,40 +349,134 @@ class UserRecipeRelationMixin:
     already_exists_message = "Рецепт уже существует."
     not_exists_message = "Рецепт не найден."
 
-    def add_relation(self, user, recipe):
-        if self.relation_model.objects.filter(user=user,
-                                              recipe=recipe).exists():
+    def add_relation(self, user, pk):
+        """
+        Добавляет связь тем же INSERT ... ON CONFLICT DO NOTHING, что
+        и пакетная операция: повтор или одновременный запрос получает
+        400, а не 500.
+        """
+        recipe = get_object_or_404(
+            Recipe.objects.only('id', 'name', 'image', 'cooking_time'),
+            pk=pk)
+        added, _, missing = add_relations(
+            self.relation_model, user, [recipe.pk])
+        if missing:
+            raise Http404
+        if not added:
             return Response(
                 {"detail": self.already_exists_message},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        self.relation_model.objects.create(user=user, recipe=recipe)
         serializer = RecipeShortSerializer(recipe,
                                            context={'request': self.request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-    def remove_relation(self, user, recipe):
-        relation_instance = self.relation_model.objects.filter(
-            user=user, recipe=recipe).first()
-        if not relation_instance:
+    def remove_relation(self, user, pk):
+        deleted, _ = self.relation_model.objects.filter(
+            user=user, recipe_id=pk).delete()
+        if not deleted:
+            get_object_or_404(Recipe.objects.only('id'), pk=pk)
             return Response(
                 {"detail": self.not_exists_message},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        relation_instance.delete()
         return Response(
             {"detail": self.success_remove_message},
             status=status.HTTP_204_NO_CONTENT
         )
 
-
-class RecipeViewSet(viewsets.ModelViewSet, UserRecipeRelationMixin):
+    def manage_relations(self, request):
+        """
+        Пакетная операция над списком {"recipes": [id, ...]}.
+        Ответ содержит результат для каждого id: added, exists,
+        removed или not_found.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'POST':
+            added, _, missing = add_relations(
+                self.relation_model, request.user, recipe_ids)
+            statuses = {'added': added, 'not_found': missing}
+            default = 'exists'
+        else:
+            removed = remove_relations(
+                self.relation_model, request.user, recipe_ids)
+            statuses = {'removed': removed}
+            default = 'not_found'
+        results = []
+        for recipe_id in dict.fromkeys(recipe_ids):
+            result = next((name for name, ids in statuses.items()
+                           if recipe_id in ids), default)
+            results.append({'id': recipe_id, 'status': result})
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+class RecipeViewSet(ConditionalGetMixin, viewsets.ModelViewSet,
+                    UserRecipeRelationMixin):
     queryset = Recipe.objects.all()
     permission_classes = [AllowAny]
     pagination_class = SetPagination
+    parser_classes = UPLOAD_PARSER_CLASSES
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_version_keys(self):
+        if self.action == 'retrieve':
+            # Ключ версии строится только из допустимого id, иначе
+            # произвольный путь превращался бы в новый ключ.
+            try:
+                recipe_id = int(self.kwargs['pk'])
+            except ValueError:
+                raise Http404
+            if not 0 < recipe_id <= MAX_ID:
+                raise Http404
+            return [recipe_key(recipe_id)]
+        return super().get_version_keys()
+
+    @property
+    def paginator(self):
+        """
+        Включает пагинацию по курсору, если в запросе передан
+        параметр cursor (для первой страницы — пустой).
+        """
+        if not hasattr(self, '_paginator'):
+            if (self.action == 'list'
+                    and RecipeCursorPagination.cursor_query_param
+                    in self.request.query_params):
+                self._paginator = RecipeCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_queryset(self):
+        """
+        Для чтения рецептов отмечает флаги текущего пользователя
+        аннотациями и заранее загружает связанные объекты, чтобы
+        число запросов не зависело от размера страницы.
+        """
+        if self.action not in ['list', 'retrieve']:
+            return super().get_queryset()
+        user = self.request.user
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.all()),
+            Prefetch('ingredient_amounts',
+                     queryset=IngredientInRecipe.objects.select_related(
+                         'ingredient')),
+        )
+        if not user.is_authenticated:
+            return queryset.annotate(is_favorited=Value(False),
+                                     is_in_shopping_cart=Value(False),
+                                     author_is_subscribed=Value(False))
+        return queryset.annotate(
+            is_favorited=Exists(FavoriteRecipe.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            author_is_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author'))),
+        )
+
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
             return RecipeGetSerializer
@@ -260,7 +494,6 @@ class RecipeViewSet(viewsets.ModelViewSet, UserRecipeRelationMixin):
             permission_classes=[IsAuthenticated])
     def manage_favorite(self, request, pk=None):
         user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
         self.relation_model = FavoriteRecipe
         self.success_add_message = "Рецепт успешно добавлен в избранное."
         self.success_remove_message = "Рецепт успешно удалён из избранного."
@@ -268,15 +501,14 @@ class RecipeViewSet(viewsets.ModelViewSet, UserRecipeRelationMixin):
         self.not_exists_message = "Рецепт не в избранном."
 
         if request.method == 'POST':
-            return self.add_relation(user, recipe)
+            return self.add_relation(user, pk)
         elif request.method == 'DELETE':
-            return self.remove_relation(user, recipe)
+            return self.remove_relation(user, pk)
 
     @action(detail=True, methods=['post', 'delete'], url_path='shopping_cart',
             permission_classes=[IsAuthenticated])
     def manage_shopping_cart(self, request, pk=None):
         user = request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
         self.relation_model = ShoppingCart
         self.success_add_message = ("Рецепт успешно добавлен в"
                                     " список покупок.")
@@ -288,90 +520,140 @@ class RecipeViewSet(viewsets.ModelViewSet, UserRecipeRelationMixin):
                                    " списке покупок.")
 
         if request.method == 'POST':
-            return self.add_relation(user, recipe)
+            return self.add_relation(user, pk)
         elif request.method == 'DELETE':
-            return self.remove_relation(user, recipe)
+            return self.remove_relation(user, pk)
 
-    @action(detail=False, methods=['get'], url_path='download_shopping_cart',
+    @action(detail=False, methods=['post', 'delete'], url_path='favorite',
             permission_classes=[IsAuthenticated])
-    def download_shopping_cart(self, request):
-        user = request.user
-        shopping_cart = ShoppingCart.objects.filter(user=user)
-        recipes = Recipe.objects.filter(
-            in_cart__in=shopping_cart).prefetch_related(
-            'ingredients')
-
-        buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-
-        font_url = FreeSans_Link
-        local_font_path = os.path.join(
-            'static',
-            'fonts',
-            'FreeSans.ttf')
-        try:
-            get_and_register_font(
-                'FreeSans',
-                font_url,
-                local_font_path)
-
-        except Exception as e:
-            print(f"Ошибка при регистрации шрифта: {e}")
-            return HttpResponse("Ошибка регистация шрифта", status=500)
-
-        p.setFont('FreeSans', 12)
-
-        p.drawString(50, 750, 'Список покупок:')
-        y = 730
-        for recipe in recipes:
-            p.drawString(50, y, f'Рецепт: {recipe.name}')
-            y -= 20
-            ingredients_in_recipe = IngredientInRecipe.objects.filter(
-                recipe=recipe).prefetch_related('ingredient')
-            for ingredient_in_recipe in ingredients_in_recipe:
-                ingredient = ingredient_in_recipe.ingredient
-                amount = ingredient_in_recipe.amount
-                p.drawString(
-                    70, y, f'- {ingredient.name}:'
-                           f' {amount} {ingredient.measurement_unit}')
-                y -= 15
-            y -= 5
-
-        p.showPage()
-        p.save()
-
-        buffer.seek(0)
-
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response[
-            'Content-Disposition'] = 'attachment; filename="shopping_cart.pdf"'
+    def manage_favorites(self, request):
+        self.relation_model = FavoriteRecipe
+        return self.manage_relations(request)
 
+    @action(detail=False, methods=['post', 'delete'], url_path='shopping_cart',
+            permission_classes=[IsAuthenticated])
+    def manage_shopping_carts(self, request):
+        self.relation_model = ShoppingCart
+        return self.manage_relations(request)
+
+    @action(detail=False, methods=['get'], url_path='download_shopping_cart',
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[PDFRenderer, JSONRenderer,
+                              PlainTextRenderer, CSVRenderer])
+    def download_shopping_cart(self, request):
+        """
+        Список покупок: суммарное количество каждого ингредиента,
+        а с параметром detailed=1 — ещё и разбивка по рецептам.
+        Параметр format выбирает pdf (по умолчанию), txt, csv или json;
+        текстовые форматы отдаются потоком прямо из выборки.
+        Готовые документы кэшируются до изменения корзины.
+        С параметром async=1 документ строится в фоне: ответ 202
+        содержит задачу, статус которой можно опрашивать.
+        """
+        export_format = request.query_params.get('format', 'pdf')
+        detailed = query_flag(request, 'detailed')
+        key = get_cart_export_key(request.user, export_format, detailed)
+        if query_flag(request, 'async'):
+            return self.enqueue_shopping_list(key, export_format, detailed)
+        # Ключ включает формат и detailed: разные документы по одному
+        # адресу не должны совпадать по ETag.
+        etag = '"%s"' % hashlib.sha1(key.encode()).hexdigest()
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            cached = export_cache.open(key)
+            if cached is not None:
+                response = FileResponse(
+                    cached,
+                    content_type=SHOPPING_LIST_CONTENT_TYPES[export_format])
+            else:
+                response = self.render_shopping_list(
+                    key, export_format, detailed)
+            response['Content-Disposition'] = (
+                f'attachment; filename="shopping_cart.{export_format}"')
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Accept',))
         return response
 
+    def enqueue_shopping_list(self, key, export_format, detailed):
+        job = enqueue_export(
+            self.request.user, export_format, detailed, key=key)
+        # Описание задачи отдаётся в JSON, какой бы формат ни запросили.
+        self.request.accepted_renderer = JSONRenderer()
+        self.request.accepted_media_type = JSONRenderer.media_type
+        url = reverse('api:export-job-detail', args=(job.pk,))
+        return Response(
+            ExportJobSerializer(job, context={'request': self.request}).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': self.request.build_absolute_uri(url)})
+
+    def render_shopping_list(self, key, export_format, detailed):
+        user = self.request.user
+        ingredients = get_cart_ingredients(user)
+        breakdown = get_cart_breakdown(user) if detailed else None
+
+        if export_format == 'pdf':
+            output = render_pdf(ingredients, breakdown)
+            size = output.seek(0, os.SEEK_END)
+            output.seek(0)
+            response = StreamingHttpResponse(
+                cache_stream(key, read_chunks(output)),
+                content_type='application/pdf')
+            response['Content-Length'] = size
+            return response
+
+        if breakdown is not None:
+            breakdown = breakdown.iterator()
+        iter_content, content_type = SHOPPING_LIST_FORMATS[export_format]
+        return StreamingHttpResponse(
+            cache_stream(key, iter_content(ingredients.iterator(),
+                                           breakdown)),
+            content_type=content_type)
+
     @action(detail=True, methods=['get'], url_path='get-link',
             permission_classes=[AllowAny])
     def get_short_link(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        short_link = generate_short_link(request, recipe.pk)
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise Http404
+        if not recipe_exists(pk):
+            raise Http404
+        short_link = generate_short_link(request, pk)
 
         return Response({'short_link': short_link},
                         status=status.HTTP_200_OK)
 
 
-def get_and_register_font(font_name, font_url, local_path):
-    """
-    Проверяет, существует ли файл шрифта по local_path.
-    Если нет, скачивает его с font_url и сохраняет по local_path,
-    затем регистрирует шрифт под именем font_name.
-    """
-    if not os.path.exists(local_path):
-        response = requests.get(font_url)
-        if response.status_code == 200:
-            os.makedirs(os.path.dirname(local_path), exist_ok=True)
-            with open(local_path, 'wb') as f:
-                f.write(response.content)
-        else:
-            raise Exception(
-                f"Ошибка скачивания шрифта. "
-                f"Код ответа: {response.status_code}")
-    pdfmetrics.registerFont(TTFont(font_name, local_path))
+class ExportJobViewSet(ReadOnlyModelViewSet):
+    """Фоновые выгрузки текущего пользователя."""
+    serializer_class = ExportJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return (
+            ExportJob.objects
+            .filter(user=self.request.user)
+            .exclude(expires_at__lte=timezone.now())
+            .defer('result')
+            .order_by('-created')
+        )
+
+    @action(detail=True, methods=['get'], url_path='download',
+            renderer_classes=[PDFRenderer, JSONRenderer,
+                              PlainTextRenderer, CSVRenderer])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != ExportJob.Status.DONE:
+            return Response(
+                {'detail': 'Выгрузка ещё не готова.'},
+                status=status.HTTP_409_CONFLICT)
+        content = ExportJob.objects.values_list(
+            'result', flat=True).get(pk=job.pk)
+        response = HttpResponse(
+            bytes(content),
+            content_type=SHOPPING_LIST_CONTENT_TYPES[job.export_format])
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{job.export_format}"')
+        return response
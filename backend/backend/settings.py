@@ -118,8 +118,42 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / '/media'
 
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
+
 CSV_FILES_DIR = BASE_DIR / 'recipes/data/'
 
+# Для нескольких процессов gunicorn нужен общий для них кэш,
+# например CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+# и CACHE_LOCATION=/var/tmp/foodgram_cache.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Каталог готовых выгрузок списков покупок, общий для всех процессов,
+# и предельный суммарный размер документов в нём.
+EXPORT_CACHE_LOCATION = os.getenv(
+    'EXPORT_CACHE_LOCATION', '/var/tmp/foodgram_exports')
+EXPORT_CACHE_MAX_SIZE = int(os.getenv(
+    'EXPORT_CACHE_MAX_SIZE', 256 * 1024 * 1024))
+
+# Предельный размер изображения, загружаемого в base64.
+IMAGE_UPLOAD_MAX_SIZE = int(os.getenv(
+    'IMAGE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024))
+
+# Фоновые выгрузки: срок хранения результата, время, после которого
+# задача зависшего воркера возвращается в очередь, и синхронный режим
+# для локального запуска без воркера.
+EXPORT_JOB_TTL = int(os.getenv('EXPORT_JOB_TTL', 60 * 60))
+EXPORT_JOB_TIMEOUT = int(os.getenv('EXPORT_JOB_TIMEOUT', 10 * 60))
+EXPORT_JOBS_EAGER = os.getenv('EXPORT_JOBS_EAGER', 'False') == 'True'
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
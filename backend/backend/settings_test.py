@@ -0,0 +1,21 @@
+"""
+Настройки для запуска тестов: SQLite вместо PostgreSQL
+и временные каталоги для медиафайлов и выгрузок.
+"""
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test.sqlite3',
+    }
+}
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram_media_')
+
+EXPORT_CACHE_LOCATION = tempfile.mkdtemp(prefix='foodgram_exports_')
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
@@ -2,8 +2,9 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.html import format_html
 
-from .models import (FavoriteRecipe, Ingredient, IngredientInRecipe, Recipe,
-                     RecipeTag, ShoppingCart, Subscription, Tag, User)
+from .models import (ExportJob, FavoriteRecipe, Ingredient,
+                     IngredientInRecipe, Recipe, RecipeTag, ShoppingCart,
+                     Subscription, Tag, User)
 
 
 @admin.register(User)
@@ -13,8 +14,8 @@ class UserAdmin(BaseUserAdmin):
     """
     model = User
     list_display = ('id', 'email', 'username',
-                    'first_name', 'last_name', 'is_staff',
-                    'is_active')
+                    'first_name', 'last_name', 'recipes_count',
+                    'followers_count', 'is_staff', 'is_active')
     list_filter = ('is_staff', 'is_active')
     search_fields = ('email', 'username',
                      'first_name', 'last_name')
@@ -79,7 +80,8 @@ class RecipeAdmin(admin.ModelAdmin):
     """
     Админка для модели рецептов.
     """
-    list_display = ('id', 'name', 'author', 'cooking_time', 'pub_date')
+    list_display = ('id', 'name', 'author', 'cooking_time', 'pub_date',
+                    'favorites_count', 'short_link_hits')
     list_filter = ('author', 'tags', 'pub_date')
     search_fields = ('name', 'author__username', 'author__email')
     inlines = [IngredientInRecipeInline, RecipeTagInline]
@@ -92,11 +94,6 @@ class RecipeAdmin(admin.ModelAdmin):
                 '<img src="{}" width="50" height="50" />',
                 obj.image.url)
 
-    def favorites_count(self, obj):
-        """Отображает количество добавлений рецепта в избранное."""
-        return obj.favorites.count()
-    favorites_count.short_description = 'В избранном'
-
 
 @admin.register(FavoriteRecipe)
 class FavoriteRecipeAdmin(admin.ModelAdmin):
@@ -126,3 +123,16 @@ class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'author')
     search_fields = ('user__username', 'author__username')
     ordering = ('id',)
+
+
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    """
+    Админка для задач выгрузки.
+    """
+    list_display = ('id', 'user', 'export_format', 'detailed', 'status',
+                    'created', 'finished_at', 'expires_at')
+    list_filter = ('status', 'export_format')
+    search_fields = ('user__username',)
+    readonly_fields = ('key', 'error', 'started_at', 'finished_at')
+    ordering = ('-created',)
@@ -0,0 +1,135 @@
+"""
+Пакетный импорт справочников (ингредиентов и тегов) из CSV.
+
+Файл читается потоково пачками по batch_size строк. Для каждой пачки
+выполняется один запрос существующих записей по уникальному name,
+новые записи вставляются одним bulk_create(ignore_conflicts=True),
+изменившиеся — одним bulk_update. Повторный импорт того же файла
+ничего не меняет, поэтому команды можно запускать при каждом старте
+контейнера.
+"""
+import csv
+import os
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from .models import IngredientInRecipe, RecipeTag
+from .versions import bump_recipes, bump_tables
+
+RECIPE_LINKS = {
+    'Ingredient': (IngredientInRecipe, 'ingredient_id'),
+    'Tag': (RecipeTag, 'tag_id'),
+}
+
+
+def read_rows(path, width):
+    """Строки CSV без пробелов по краям; короткие строки пропускаются."""
+    with open(path, 'r', encoding='utf-8', newline='') as csvfile:
+        for row in csv.reader(csvfile):
+            if len(row) >= width:
+                yield tuple(value.strip() for value in row[:width])
+
+
+def import_catalog(model, rows, fields, batch_size=1000, dry_run=False,
+                   progress=None):
+    """
+    Импортирует строки rows (кортежи значений fields, первое — name)
+    и возвращает словарь с числом inserted, updated и skipped строк.
+    """
+    counts = {'inserted': 0, 'updated': 0, 'skipped': 0}
+    update_fields = fields[1:]
+    updated_ids = []
+    rows = iter(rows)
+    while True:
+        batch = {}
+        for row in islice(rows, batch_size):
+            if row[0] in batch:
+                counts['skipped'] += 1
+            batch[row[0]] = dict(zip(fields, row))
+        if not batch:
+            break
+        existing = model.objects.in_bulk(list(batch), field_name='name')
+        new, changed = [], []
+        for name, values in batch.items():
+            obj = existing.get(name)
+            if obj is None:
+                new.append(model(**values))
+            elif any(getattr(obj, field) != values[field]
+                     for field in update_fields):
+                for field in update_fields:
+                    setattr(obj, field, values[field])
+                changed.append(obj)
+            else:
+                counts['skipped'] += 1
+        counts['updated'] += len(changed)
+        if dry_run:
+            counts['inserted'] += len(new)
+        else:
+            with transaction.atomic():
+                model.objects.bulk_create(new, ignore_conflicts=True)
+                # Строки, конфликтующие по другим уникальным полям
+                # (например, slug тега), база отбрасывает молча:
+                # вставленными считаются только появившиеся имена.
+                inserted = model.objects.filter(
+                    name__in=[obj.name for obj in new]).count() if new else 0
+                if changed:
+                    model.objects.bulk_update(changed, update_fields)
+            counts['inserted'] += inserted
+            counts['skipped'] += len(new) - inserted
+            updated_ids.extend(obj.pk for obj in changed)
+        if progress is not None:
+            progress(counts)
+
+    if not dry_run and (counts['inserted'] or counts['updated']):
+        # bulk-операции не отправляют сигналов: версии меняются здесь.
+        bump_tables(model._meta.model_name + 's')
+        if updated_ids:
+            link_model, fk_name = RECIPE_LINKS[model._meta.object_name]
+            bump_recipes(link_model.objects.filter(
+                **{f'{fk_name}__in': updated_ids},
+            ).values_list('recipe_id', flat=True).distinct())
+    return counts
+
+
+class CatalogImportCommand(BaseCommand):
+    """Общая часть команд import_ingredients и import_tags."""
+    model = None
+    fields = ()
+    file_name = None
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file', default=os.path.join(
+                settings.CSV_FILES_DIR, self.file_name),
+            help='Путь к CSV-файлу')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одной пачке')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только подсчитать изменения, ничего не записывая')
+
+    def handle(self, *args, **options):
+        path = options['file']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше 0.')
+
+        def progress(counts):
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    'Обработано строк: ' + str(sum(counts.values())))
+
+        counts = import_catalog(
+            self.model, read_rows(path, len(self.fields)), self.fields,
+            batch_size=options['batch_size'], dry_run=options['dry_run'],
+            progress=progress)
+        prefix = 'Пробный запуск: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix}добавлено {counts["inserted"]}, '
+            f'обновлено {counts["updated"]}, '
+            f'пропущено {counts["skipped"]}.'))
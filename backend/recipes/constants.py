@@ -6,8 +6,23 @@ MAX_LENGTH_INGREDIENT = 200
 MAX_LENGTH_MEASURMENT_UNIT = 50
 MAX_LENGTH_RECIPE = 200
 USERNAME_SEARCH_REGEX = r'^[\w.@+-]+\Z'
-FreeSans_Link = ("https://raw.githubusercontent.com/"
-                 "opensourcedesign/fonts/master/"
-                 "gnu-freefont_freesans/FreeSans.ttf")
 PAGE_SIZE = 6
 MAX_PAGE_SIZE = 100
+RECIPE_CACHE_TIMEOUT = 60 * 10
+MAX_LENGTH_FORMAT = 10
+MAX_LENGTH_JOB_KEY = 128
+IMAGE_DERIVATIVE_WIDTHS = (160, 480, 1080)
+IMAGE_DERIVATIVE_QUALITY = 80
+MAX_IMAGE_SIDE = 8000
+MAX_RELATION_BATCH = 100
+SHORT_LINK_CACHE_TIMEOUT = 60 * 60 * 24
+SHORT_LINK_MISS_TIMEOUT = 60
+SHORT_LINK_REDIRECT_MAX_AGE = 60 * 60
+SHORT_LINK_FLUSH_SIZE = 1000
+SHORT_LINK_FLUSH_INTERVAL = 30
+MAX_LENGTH_VERSION_KEY = 64
+VERSION_BATCH_SIZE = 500
+EXPORT_CACHE_CHUNK_SIZE = 64 * 1024
+EXPORT_TEMP_MAX_AGE = 60 * 60
+MAX_LENGTH_FILE_NAME = 255
+MAX_ID = 2 ** 63 - 1
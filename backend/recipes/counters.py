@@ -0,0 +1,62 @@
+"""
+Денормализованные счётчики.
+
+Каждый счётчик описан кортежем (модель связи, поле внешнего ключа,
+модель со счётчиком, поле счётчика). Сигналы изменяют счётчики
+атомарно через F(), а код с bulk_create, который не отправляет
+сигналов, вызывает adjust_counter сам. Расхождения исправляет
+команда recount.
+"""
+from collections import Counter
+
+from django.apps import apps as global_apps
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+COUNTERS = (
+    ('Recipe', 'author', 'User', 'recipes_count'),
+    ('FavoriteRecipe', 'recipe', 'Recipe', 'favorites_count'),
+    ('ShoppingCart', 'recipe', 'Recipe', 'in_cart_count'),
+    ('Subscription', 'author', 'User', 'followers_count'),
+)
+
+
+def get_counter(model):
+    for source, fk_name, target, field in COUNTERS:
+        if model._meta.object_name == source:
+            return fk_name, target, field
+    return None
+
+
+def adjust_counter(model, target_ids, delta):
+    """
+    Изменяет счётчик model для каждого id из target_ids на delta
+    (id может повторяться).
+    """
+    fk_name, target, field = get_counter(model)
+    target_model = global_apps.get_model('recipes', target)
+    by_delta = {}
+    for target_id, count in Counter(target_ids).items():
+        by_delta.setdefault(count * delta, []).append(target_id)
+    for change, ids in by_delta.items():
+        target_model.objects.filter(pk__in=ids).update(
+            **{field: Greatest(F(field) + change, Value(0))})
+
+
+def recount(apps=global_apps):
+    """
+    Пересчитывает все счётчики и возвращает словарь
+    {поле: число исправленных строк}.
+    """
+    fixed = {}
+    for source, fk_name, target, field in COUNTERS:
+        source_model = apps.get_model('recipes', source)
+        target_model = apps.get_model('recipes', target)
+        actual = Coalesce(Subquery(
+            source_model.objects.filter(**{fk_name: OuterRef('pk')})
+            .order_by().values(fk_name).annotate(total=Count('pk'))
+            .values('total')
+        ), 0)
+        fixed[field] = target_model.objects.filter(
+            ~Q(**{field: actual})).update(**{field: actual})
+    return fixed
@@ -0,0 +1,113 @@
+"""
+Уменьшенные копии изображений рецептов и аватаров.
+
+Для каждого загруженного файла строятся копии шириной
+IMAGE_DERIVATIVE_WIDTHS в WebP и JPEG. Они лежат рядом с остальными
+файлами под именами derivatives/<имя оригинала>_<ширина>.<формат>,
+поэтому по имени оригинала их можно найти без обращения к базе.
+
+Один файл может принадлежать нескольким рецептам и пользователям
+(см. recipes.storage), поэтому он удаляется вместе с копиями только
+тогда, когда на него не ссылается ни одна запись.
+"""
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .constants import IMAGE_DERIVATIVE_QUALITY, IMAGE_DERIVATIVE_WIDTHS
+from .models import Recipe, StoredFile, User
+from .storage import lock_file
+
+DERIVATIVE_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+
+
+def derivative_name(name, width, extension):
+    return f'derivatives/{name}_{width}.{extension}'
+
+
+def has_derivatives(name, storage=default_storage):
+    """Проверяет наличие самой маленькой копии как признак готовности."""
+    return storage.exists(derivative_name(
+        name, IMAGE_DERIVATIVE_WIDTHS[0], next(iter(DERIVATIVE_FORMATS))))
+
+
+def build_derivatives(name, storage=default_storage):
+    """
+    Строит все копии изображения name и возвращает их имена.
+    Изображения меньше нужной ширины не увеличиваются.
+    """
+    with storage.open(name) as original:
+        image = ImageOps.exif_transpose(Image.open(original))
+        image = image.convert('RGB')
+    names = []
+    for width in IMAGE_DERIVATIVE_WIDTHS:
+        resized = image
+        if image.width > width:
+            resized = image.resize(
+                (width, round(image.height * width / image.width)),
+                Image.LANCZOS)
+        for extension, image_format in DERIVATIVE_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, image_format,
+                         quality=IMAGE_DERIVATIVE_QUALITY, optimize=True)
+            target = derivative_name(name, width, extension)
+            storage.delete(target)
+            names.append(storage.save(target, ContentFile(buffer.getvalue())))
+    return names
+
+
+def delete_derivatives(name, storage=default_storage):
+    for width in IMAGE_DERIVATIVE_WIDTHS:
+        for extension in DERIVATIVE_FORMATS:
+            storage.delete(derivative_name(name, width, extension))
+
+
+def is_referenced(name):
+    return (Recipe.objects.filter(image=name).exists()
+            or User.objects.filter(avatar=name).exists())
+
+
+def release_image(name, storage=default_storage):
+    """
+    Удаляет файл и его копии, если он больше никому не нужен.
+    Ссылки проверяются под блокировкой имени (recipes.storage.lock_file),
+    поэтому файл, который одновременно сохраняют для новой записи,
+    не будет удалён.
+    """
+    if not name:
+        return False
+    with transaction.atomic():
+        lock_file(name)
+        if is_referenced(name):
+            return False
+        storage.delete(name)
+        delete_derivatives(name, storage)
+        StoredFile.objects.filter(name=name).delete()
+    return True
+
+
+def image_srcset(field_file, request=None, storage=default_storage):
+    """
+    Значения srcset для каждого формата, например
+    {"webp": "<url> 160w, <url> 480w, ...", "jpeg": ...}.
+    Если копии ещё не построены, возвращает None.
+    """
+    if not field_file or not has_derivatives(field_file.name, storage):
+        return None
+    srcset = {}
+    for extension in DERIVATIVE_FORMATS:
+        urls = []
+        for width in IMAGE_DERIVATIVE_WIDTHS:
+            url = storage.url(derivative_name(field_file.name, width,
+                                              extension))
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls.append(f'{url} {width}w')
+        srcset[extension] = ', '.join(urls)
+    return srcset
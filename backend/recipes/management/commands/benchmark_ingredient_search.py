@@ -0,0 +1,56 @@
+import timeit
+
+from api.ingredient_index import ingredient_index
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import Ingredient
+
+DEFAULT_QUERIES = ('сол', 'масло', 'картоф', 'м')
+
+
+def orm_search(query):
+    """Прежний поиск через базу: istartswith или icontains."""
+    results_start = Ingredient.objects.filter(name__istartswith=query)
+    results_contains = Ingredient.objects.filter(
+        name__icontains=query).exclude(name__istartswith=query)
+    return list((results_start | results_contains).order_by('name').values(
+        'id', 'name', 'measurement_unit'))
+
+
+def index_search(query):
+    return ingredient_index.search(query)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время поиска ингредиентов по индексу в памяти '
+            'и запросом к базе')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'queries', nargs='*', default=DEFAULT_QUERIES,
+            help='Поисковые строки (по умолчанию: %(default)s)')
+        parser.add_argument(
+            '--repeat', type=int, default=200,
+            help='Сколько раз выполнить каждый поиск')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть положительным.')
+        if not Ingredient.objects.exists():
+            raise CommandError(
+                'Справочник ингредиентов пуст, выполните import_ingredients.')
+        ingredient_index.refresh()
+        self.stdout.write(
+            f'Ингредиентов: {Ingredient.objects.count()}, '
+            f'повторов: {options["repeat"]}')
+        for query in options['queries']:
+            timings = {}
+            for label, search in (('индекс', index_search),
+                                  ('база', orm_search)):
+                timings[label] = timeit.timeit(
+                    lambda: search(query), number=options['repeat']
+                ) / options['repeat']
+            self.stdout.write(
+                f'{query!r}: найдено {len(index_search(query))}, '
+                f'индекс {timings["индекс"] * 10 ** 6:.0f} мкс, '
+                f'база {timings["база"] * 10 ** 6:.0f} мкс, '
+                f'ускорение в {timings["база"] / timings["индекс"]:.1f} раз')
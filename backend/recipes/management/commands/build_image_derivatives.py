@@ -0,0 +1,66 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+from recipes.constants import VERSION_BATCH_SIZE
+from recipes.images import build_derivatives, has_derivatives
+from recipes.models import Recipe, User
+from recipes.versions import bump_recipes
+
+
+def build(name):
+    try:
+        build_derivatives(name)
+    except Exception as error:
+        return name, repr(error)
+    return name, None
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные копии изображений рецептов и аватаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help='Количество процессов (по умолчанию — по числу ядер)')
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перестроить копии, даже если они уже есть')
+
+    def handle(self, *args, **options):
+        names = set(Recipe.objects.exclude(image='').exclude(
+            image__isnull=True).values_list('image', flat=True))
+        names.update(User.objects.exclude(avatar='').exclude(
+            avatar__isnull=True).values_list('avatar', flat=True))
+        if not options['force']:
+            names = {name for name in names if not has_derivatives(name)}
+        # Дочерние процессы не должны наследовать открытые соединения.
+        connections.close_all()
+
+        built = []
+        failed = 0
+        with ProcessPoolExecutor(max_workers=options['processes']) as pool:
+            for name, error in pool.map(build, sorted(names), chunksize=8):
+                if error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                else:
+                    built.append(name)
+        self.bump_referencing_recipes(built)
+        self.stdout.write(self.style.SUCCESS(
+            f'Копии построены: {len(built)}, ошибок: {failed}.'))
+
+    def bump_referencing_recipes(self, names):
+        """
+        Копии входят в представления рецептов (image_srcset рецепта
+        и аватара автора): без новой версии закэшированные
+        представления и валидаторы ответов остались бы прежними.
+        """
+        for start in range(0, len(names), VERSION_BATCH_SIZE):
+            chunk = names[start:start + VERSION_BATCH_SIZE]
+            recipe_ids = list(Recipe.objects.filter(
+                Q(image__in=chunk) | Q(author__avatar__in=chunk),
+            ).values_list('id', flat=True))
+            if recipe_ids:
+                bump_recipes(recipe_ids)
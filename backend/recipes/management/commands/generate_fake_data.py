@@ -0,0 +1,228 @@
+import os
+import random
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.counters import recount
+from recipes.images import build_derivatives, has_derivatives
+from recipes.models import (FavoriteRecipe, Ingredient, IngredientInRecipe,
+                            Recipe, RecipeTag, ShoppingCart, Subscription,
+                            Tag, User)
+from recipes.versions import bump_tables
+
+SAMPLE_IMAGES = [f'recipe{number}.jpg' for number in range(1, 7)]
+WORDS = ('суп', 'салат', 'пирог', 'рагу', 'паста', 'каша', 'запеканка',
+         'омлет', 'соус', 'десерт', 'смузи', 'плов', 'жаркое', 'котлеты')
+
+
+def zipf_cum_weights(size, exponent):
+    """Накопленные веса распределения Ципфа для size элементов."""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, size + 1)))
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетические данные для нагрузочного тестирования: '
+            'популярность авторов и рецептов распределена по Ципфу')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients', type=int, default=500,
+                            help='Размер справочника, если он меньше')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--favorites', type=int, default=50000)
+        parser.add_argument('--cart', type=int, default=20000)
+        parser.add_argument('--subscriptions', type=int, default=20000)
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Показатель распределения популярности')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='fake',
+                            help='Префикс имён пользователей и тегов')
+
+    def validate_options(self, options):
+        """
+        Проверяет параметры до создания данных: пустые выборки
+        уронили бы генерацию на середине.
+        """
+        for name in ('users', 'recipes', 'ingredients', 'tags',
+                     'favorites', 'cart', 'subscriptions'):
+            if options[name] < 0:
+                raise CommandError(
+                    f'--{name} не может быть отрицательным.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть не меньше 1.')
+        needs_users = options['recipes'] or any(
+            options[name] for name in ('favorites', 'cart',
+                                       'subscriptions'))
+        if needs_users and options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь (--users).')
+        if options['recipes'] == 0:
+            if options['favorites'] or options['cart']:
+                raise CommandError(
+                    'Избранное и список покупок требуют рецептов '
+                    '(--recipes).')
+            return
+        if options['tags'] < 1:
+            raise CommandError('Для рецептов нужен хотя бы один тег (--tags).')
+        if options['ingredients_per_recipe'] < 1:
+            raise CommandError(
+                '--ingredients-per-recipe должен быть не меньше 1.')
+        if options['ingredients'] < 1 and not Ingredient.objects.exists():
+            raise CommandError(
+                'Справочник ингредиентов пуст: загрузите его или '
+                'укажите --ingredients.')
+
+    def handle(self, *args, **options):
+        self.validate_options(options)
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f'Пользователи с префиксом "{prefix}" уже есть, '
+                f'укажите другой --prefix.')
+
+        user_ids = self.create_users(prefix)
+        tag_ids = self.create_tags(prefix)
+        ingredient_ids = self.ensure_ingredients(prefix)
+        recipe_ids = self.create_recipes(user_ids)
+        self.create_recipe_links(recipe_ids, tag_ids, ingredient_ids)
+
+        recipe_weights = zipf_cum_weights(
+            len(recipe_ids), options['zipf'])
+        for model, count in ((FavoriteRecipe, options['favorites']),
+                             (ShoppingCart, options['cart'])):
+            self.create_pairs(model, 'recipe_id', count, user_ids,
+                              recipe_ids, recipe_weights)
+        self.create_pairs(Subscription, 'author_id',
+                          options['subscriptions'], user_ids, user_ids,
+                          zipf_cum_weights(len(user_ids), options['zipf']))
+
+        # Счётчики и версии не обновлялись: bulk_create
+        # не отправляет сигналов.
+        recount()
+        bump_tables('recipes', 'tags', 'ingredients')
+        self.stdout.write(self.style.SUCCESS('Данные созданы.'))
+
+    def bulk_insert(self, model, objects):
+        objects = iter(objects)
+        total = 0
+        while True:
+            batch = list(islice(objects, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+            total += len(batch)
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {total}')
+
+    def create_users(self, prefix):
+        password = make_password('password')
+        self.bulk_insert(User, (
+            User(username=f'{prefix}{number}',
+                 email=f'{prefix}{number}@example.com',
+                 first_name=f'Имя{number}', last_name=f'Фамилия{number}',
+                 password=password)
+            for number in range(self.options['users'])))
+        return list(User.objects.filter(
+            username__startswith=prefix).order_by('id').values_list(
+            'id', flat=True))
+
+    def create_tags(self, prefix):
+        self.bulk_insert(Tag, (
+            Tag(name=f'{prefix} тег {number}', slug=f'{prefix}-{number}')
+            for number in range(self.options['tags'])))
+        return list(Tag.objects.filter(
+            slug__startswith=f'{prefix}-').values_list('id', flat=True))
+
+    def ensure_ingredients(self, prefix):
+        missing = self.options['ingredients'] - Ingredient.objects.count()
+        if missing > 0:
+            self.bulk_insert(Ingredient, (
+                Ingredient(name=f'{prefix} ингредиент {number}',
+                           measurement_unit=self.rng.choice(('г', 'мл',
+                                                             'шт')))
+                for number in range(missing)))
+        return list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True))
+
+    def store_sample_images(self):
+        """Каждое образцовое изображение сохраняется один раз."""
+        names = []
+        for file_name in SAMPLE_IMAGES:
+            path = os.path.join(settings.CSV_FILES_DIR, file_name)
+            with open(path, 'rb') as image_file:
+                name = default_storage.save(
+                    f'recipes/{file_name}', File(image_file))
+            if not has_derivatives(name):
+                build_derivatives(name)
+            names.append(name)
+        return names
+
+    def create_recipes(self, user_ids):
+        images = self.store_sample_images()
+        authors = self.rng.choices(
+            user_ids, cum_weights=zipf_cum_weights(
+                len(user_ids), self.options['zipf']),
+            k=self.options['recipes'])
+        self.bulk_insert(Recipe, (
+            Recipe(name=f'{self.rng.choice(WORDS).capitalize()} {number}',
+                   text=' '.join(self.rng.choices(WORDS, k=40)),
+                   cooking_time=self.rng.randint(5, 180),
+                   image=self.rng.choice(images),
+                   author_id=author_id)
+            for number, author_id in enumerate(authors)))
+        # SQLite не возвращает id из bulk_create: рецепты новых
+        # авторов выбираются в порядке вставки.
+        return list(Recipe.objects.filter(
+            author_id__in=user_ids).order_by('id').values_list(
+            'id', flat=True))
+
+    def create_recipe_links(self, recipe_ids, tag_ids, ingredient_ids):
+        per_recipe = min(self.options['ingredients_per_recipe'],
+                         len(ingredient_ids))
+        tag_weights = zipf_cum_weights(len(tag_ids), self.options['zipf'])
+        self.bulk_insert(RecipeTag, (
+            RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in set(self.rng.choices(
+                tag_ids, cum_weights=tag_weights,
+                k=self.rng.randint(1, 3)))))
+        self.bulk_insert(IngredientInRecipe, (
+            IngredientInRecipe(recipe_id=recipe_id,
+                               ingredient_id=ingredient_id,
+                               amount=self.rng.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in self.rng.sample(
+                ingredient_ids, self.rng.randint(1, per_recipe))))
+
+    def create_pairs(self, model, target_field, count, user_ids,
+                     targets, cum_weights):
+        """
+        count уникальных пар (пользователь, цель): пользователи
+        выбираются равномерно, цели — по весам популярности.
+        Подписка на самого себя не создаётся.
+        """
+        pairs = set()
+        for _ in range(10):
+            missing = count - len(pairs)
+            if missing <= 0:
+                break
+            pairs.update(
+                pair for pair in zip(
+                    self.rng.choices(user_ids, k=missing),
+                    self.rng.choices(targets, cum_weights=cum_weights,
+                                     k=missing))
+                if target_field != 'author_id' or pair[0] != pair[1])
+        self.bulk_insert(model, (
+            model(user_id=user_id, **{target_field: target})
+            for user_id, target in sorted(pairs)))
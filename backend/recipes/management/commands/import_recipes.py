@@ -1,82 +1,270 @@
 import csv
 import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 
+from django.conf import settings
 from django.core.files import File
-from django.core.management.base import BaseCommand
-from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag, User
+from django.core.files.storage import default_storage
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+from recipes.counters import adjust_counter
+from recipes.images import build_derivatives, has_derivatives, release_image
+from recipes.models import (Ingredient, IngredientInRecipe, Recipe,
+                            RecipeTag, Tag, User)
+from recipes.storage import lock_file
+from recipes.versions import bump_recipes
+
+
+class RowError(ValueError):
+    pass
+
+
+def parse_ids(value, known, kind):
+    ids = [int(item) for item in value.split(';') if item.strip()]
+    missing = [pk for pk in ids if pk not in known]
+    if missing:
+        raise RowError(f'{kind} не найдены: '
+                       + ', '.join(map(str, missing)))
+    if len(set(ids)) != len(ids):
+        raise RowError(f'{kind} повторяются')
+    return ids
+
+
+def parse_ingredients(value, known):
+    amounts = {}
+    for item in value.split(';'):
+        if not item.strip():
+            continue
+        ingredient_id, amount = (int(part) for part in item.split(':'))
+        if ingredient_id not in known:
+            raise RowError(f'ингредиент {ingredient_id} не найден')
+        if ingredient_id in amounts:
+            raise RowError(f'ингредиент {ingredient_id} повторяется')
+        if amount <= 0:
+            raise RowError(f'количество ингредиента {ingredient_id} '
+                           f'должно быть больше 0')
+        try:
+            IngredientInRecipe._meta.get_field('amount').run_validators(
+                amount)
+        except ValidationError as error:
+            raise RowError(f'количество ингредиента {ingredient_id}: '
+                           + ' '.join(error.messages))
+        amounts[ingredient_id] = amount
+    return amounts
+
+
+def store_image(path):
+    """
+    Сохраняет изображение в хранилище (одинаковые файлы хранятся
+    один раз) и строит его уменьшенные копии.
+    """
+    with open(path, 'rb') as image_file:
+        name = default_storage.save(
+            'recipes/' + os.path.basename(path), File(image_file))
+    if not has_derivatives(name):
+        build_derivatives(name)
+    return name
 
 
 class Command(BaseCommand):
     help = 'Импортирует рецепты из CSV файла'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file', default=os.path.join(
+                settings.CSV_FILES_DIR, 'recipes.csv'),
+            help='Путь к CSV-файлу; изображения ищутся рядом с ним')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество рецептов в одной транзакции')
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Количество потоков для копирования изображений')
+
     def handle(self, *args, **options):
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        data_dir = os.path.join(base_dir, '..', '..', 'data')
-        csv_file_path = os.path.join(data_dir, 'recipes.csv')
+        path = options['file']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден.')
+        self.data_dir = os.path.dirname(path)
 
-        if not os.path.exists(csv_file_path):
-            self.stdout.write(self.style.ERROR(
-                f'Файл {csv_file_path} не найден.'))
-            return
+        # Справочники загружаются один раз на весь импорт.
+        self.user_ids = set(User.objects.values_list('id', flat=True))
+        self.tag_ids = set(Tag.objects.values_list('id', flat=True))
+        self.ingredient_ids = set(
+            Ingredient.objects.values_list('id', flat=True))
+        self.known_names = set(Recipe.objects.values_list('name', flat=True))
 
-        with open(csv_file_path, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                try:
-                    name = row['name'].strip()
-                    text = row['text'].strip()
-                    cooking_time = int(row['cooking_time'])
-                    image_filename = row['image'].strip()
-                    author_id = int(row['author_id'])
-
-                    author = User.objects.get(id=author_id)
-
-                    if Recipe.objects.filter(name=name).exists():
-                        self.stdout.write(self.style.WARNING(
-                            f'Рецепт "{name}" уже существует. Пропускаем.'))
-                        continue
-
-                    recipe = Recipe.objects.create(
-                        name=name,
-                        text=text,
-                        cooking_time=cooking_time,
-                        author=author,
-                    )
-
-                    image_path = os.path.join(data_dir, image_filename)
-                    if os.path.exists(image_path):
-                        with open(image_path, 'rb') as img_file:
-                            recipe.image.save(
-                                image_filename,
-                                File(img_file), save=True)
-                    else:
-                        self.stdout.write(self.style.WARNING(
-                            f'Изображение "{image_filename}" не найдено.'
-                            f' Пропускаем.'))
-
-                    tags_ids = row['tags'].split(';')
-                    for tag_id in tags_ids:
-                        tag = Tag.objects.get(id=int(tag_id))
-                        recipe.tags.add(tag)
-
-                    ingredients_data = row['ingredients'].split(';')
-                    for ingredient_data in ingredients_data:
-                        ingredient_id, amount = ingredient_data.split(':')
-                        ingredient = Ingredient.objects.get(
-                            id=int(ingredient_id))
-                        IngredientInRecipe.objects.create(
-                            recipe=recipe,
-                            ingredient=ingredient,
-                            amount=int(amount)
-                        )
-
-                    recipe.save()
-                    self.stdout.write(self.style.SUCCESS(
-                        f'Рецепт "{name}" успешно добавлен.'))
-
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(
-                        f'Ошибка при добавлении рецепта: {e}'))
+        self.imported = self.skipped = self.failed = 0
+        with open(path, 'r', encoding='utf-8', newline='') as csvfile, \
+                ThreadPoolExecutor(options['workers']) as pool:
+            self.pool = pool
+            self.images = {}
+            rows = enumerate(csv.DictReader(csvfile), start=2)
+            while True:
+                chunk = list(islice(rows, options['batch_size']))
+                if not chunk:
+                    break
+                self.import_chunk(chunk)
 
         self.stdout.write(self.style.SUCCESS(
-            'Импорт рецептов завершен.'))
+            f'Импорт рецептов завершен: добавлено {self.imported}, '
+            f'пропущено {self.skipped}, с ошибками {self.failed}.'))
+
+    def parse_row(self, row):
+        """
+        Разбирает строку и проверяет поля рецепта так же, как модель,
+        чтобы ошибки данных не срывали вставку всей пачки.
+        """
+        author_id = int(row['author_id'])
+        if author_id not in self.user_ids:
+            raise RowError(f'автор {author_id} не найден')
+        recipe = Recipe(
+            name=row['name'].strip(),
+            text=row['text'].strip(),
+            cooking_time=int(row['cooking_time']),
+            author_id=author_id)
+        if recipe.cooking_time < 1:
+            raise RowError('время приготовления должно быть не меньше 1')
+        try:
+            recipe.clean_fields(exclude=('image', 'author'))
+        except ValidationError as error:
+            raise RowError('; '.join(
+                f'{field}: {" ".join(messages)}'
+                for field, messages in error.message_dict.items()))
+        return {
+            'recipe': recipe,
+            'image': row['image'].strip(),
+            'tags': parse_ids(row['tags'], self.tag_ids, 'теги'),
+            'ingredients': parse_ingredients(
+                row['ingredients'], self.ingredient_ids),
+        }
+
+    def get_image(self, filename):
+        """Копирование каждого файла запускается в пуле один раз."""
+        if filename not in self.images:
+            image_path = os.path.join(self.data_dir, filename)
+            self.images[filename] = (
+                self.pool.submit(store_image, image_path)
+                if os.path.exists(image_path) else None)
+        return self.images[filename]
+
+    def insert_records(self, records):
+        """
+        Вставляет рецепты со связями; вызывается внутри транзакции.
+        Имена изображений блокируются до её конца, поэтому одновременное
+        удаление рецепта с тем же файлом его не сотрёт
+        (recipes.storage.lock_file); удалённый до блокировки файл
+        сохраняется заново.
+        """
+        for record in records:
+            name = record['recipe'].image.name
+            if name:
+                lock_file(name)
+                if not default_storage.exists(name):
+                    record['recipe'].image = store_image(record['path'])
+        recipes = [record['recipe'] for record in records]
+        Recipe.objects.bulk_create(recipes)
+        if any(recipe.pk is None for recipe in recipes):
+            # SQLite не возвращает id из bulk_create; имена в
+            # импорте уникальны, поэтому id находятся по ним.
+            ids = dict(Recipe.objects.filter(
+                name__in=[recipe.name for recipe in recipes],
+            ).values_list('name', 'id'))
+            for recipe in recipes:
+                recipe.pk = ids[recipe.name]
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe_id=record['recipe'].pk, tag_id=tag_id)
+            for record in records for tag_id in record['tags'])
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe_id=record['recipe'].pk,
+                               ingredient_id=ingredient_id,
+                               amount=amount)
+            for record in records
+            for ingredient_id, amount in record['ingredients'].items())
+        # bulk_create не отправляет сигналов.
+        adjust_counter(Recipe, [recipe.author_id for recipe in recipes], 1)
+
+    def insert_rows_separately(self, records):
+        """
+        Вставляет рецепты по одному, каждый в своей точке сохранения,
+        и возвращает вставленные; об остальных сообщает построчно.
+        """
+        inserted = []
+        for record in records:
+            try:
+                with transaction.atomic():
+                    self.insert_records([record])
+            except DatabaseError as e:
+                record['recipe'].pk = None
+                self.failed += 1
+                self.known_names.discard(record['recipe'].name)
+                self.stdout.write(self.style.ERROR(
+                    f'Строка {record["line"]}: ошибка при добавлении '
+                    f'рецепта: {e}'))
+            else:
+                inserted.append(record)
+        return inserted
+
+    def import_chunk(self, chunk):
+        records = []
+        for line, row in chunk:
+            try:
+                record = self.parse_row(row)
+            except (RowError, KeyError, ValueError, AttributeError) as e:
+                self.failed += 1
+                self.stdout.write(self.style.ERROR(
+                    f'Строка {line}: ошибка при добавлении рецепта: {e}'))
+                continue
+            name = record['recipe'].name
+            if name in self.known_names:
+                self.skipped += 1
+                self.stdout.write(self.style.WARNING(
+                    f'Рецепт "{name}" уже существует. Пропускаем.'))
+                continue
+            self.known_names.add(name)
+            record['line'] = line
+            if record['image']:
+                record['path'] = os.path.join(self.data_dir, record['image'])
+                record['image'] = self.get_image(record['image'])
+            records.append(record)
+
+        for record in records:
+            future = record['image']
+            if future is None:
+                self.stdout.write(self.style.WARNING(
+                    f'Строка {record["line"]}: изображение не найдено.'))
+                continue
+            if future:
+                try:
+                    record['recipe'].image = future.result()
+                except OSError as e:
+                    self.stdout.write(self.style.WARNING(
+                        f'Строка {record["line"]}: '
+                        f'изображение не скопировано: {e}'))
+        if not records:
+            return
+
+        try:
+            with transaction.atomic():
+                self.insert_records(records)
+            inserted = records
+        except DatabaseError as e:
+            for record in records:
+                record['recipe'].pk = None
+            self.stdout.write(self.style.WARNING(
+                f'Пачка не вставлена ({e}), рецепты добавляются '
+                f'по одному.'))
+            inserted = self.insert_rows_separately(records)
+        # Изображения сохранены до транзакции: файлы невставленных
+        # рецептов удаляются, если на них никто не ссылается.
+        for record in records:
+            recipe = record['recipe']
+            if recipe.pk is None and recipe.image.name:
+                release_image(recipe.image.name)
+        if not inserted:
+            return
+        bump_recipes(record['recipe'].pk for record in inserted)
+        self.imported += len(inserted)
+        self.stdout.write(f'Добавлено рецептов: {self.imported}')
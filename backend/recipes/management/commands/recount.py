@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from recipes.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счётчики'
+
+    def handle(self, *args, **options):
+        for field, fixed in recount().items():
+            self.stdout.write(f'{field}: исправлено строк: {fixed}')
+        self.stdout.write(self.style.SUCCESS(
+            'Счётчики пересчитаны.'))
@@ -0,0 +1,42 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from api.jobs import (claim_pending_jobs, purge_expired_jobs,
+                      requeue_stale_jobs, run_job_in_thread)
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые выгрузки списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Количество потоков-исполнителей')
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Пауза между опросами пустой очереди, секунды')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить задачи из очереди и завершиться')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            running = set()
+            while True:
+                requeue_stale_jobs()
+                purge_expired_jobs()
+                job_ids = claim_pending_jobs(workers - len(running))
+                running.update(
+                    executor.submit(run_job_in_thread, job_id)
+                    for job_id in job_ids)
+                if options['once'] and not running:
+                    break
+                if running:
+                    _, running = wait(
+                        running, timeout=options['poll_interval'],
+                        return_when='FIRST_COMPLETED')
+                else:
+                    time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS('Очередь выгрузок пуста.'))
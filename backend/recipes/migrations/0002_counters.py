@@ -0,0 +1,60 @@
+# Generated by Django 3.2.3 on 2026-10-17 07:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('Recipe', 'author', 'User', 'recipes_count'),
+    ('FavoriteRecipe', 'recipe', 'Recipe', 'favorites_count'),
+    ('ShoppingCart', 'recipe', 'Recipe', 'in_cart_count'),
+    ('Subscription', 'author', 'User', 'followers_count'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for source, fk_name, target, field in COUNTERS:
+        source_model = apps.get_model('recipes', source)
+        target_model = apps.get_model('recipes', target)
+        actual = Coalesce(Subquery(
+            source_model.objects.filter(**{fk_name: OuterRef('pk')})
+            .order_by().values(fk_name).annotate(total=Count('pk'))
+            .values('total')
+        ), 0)
+        target_model.objects.filter(
+            ~Q(**{field: actual})).update(**{field: actual})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'ordering': ('-pub_date',), 'verbose_name': 'Рецепт', 'verbose_name_plural': 'Рецепты'},
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В списках покупок'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество подписчиков'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество рецептов'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
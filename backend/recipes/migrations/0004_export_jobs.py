@@ -0,0 +1,37 @@
+# Generated by Django 3.2.3 on 2026-10-17 07:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipe_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('export_format', models.CharField(max_length=10, verbose_name='Формат')),
+                ('detailed', models.BooleanField(default=False, verbose_name='С разбивкой по рецептам')),
+                ('key', models.CharField(db_index=True, max_length=128, verbose_name='Ключ выгрузки')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], db_index=True, default='pending', max_length=10, verbose_name='Статус')),
+                ('result', models.BinaryField(null=True, verbose_name='Документ')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начата')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+                ('expires_at', models.DateTimeField(blank=True, db_index=True, null=True, verbose_name='Хранится до')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Задача выгрузки',
+                'verbose_name_plural': 'Задачи выгрузки',
+                'ordering': ('created',),
+            },
+        ),
+    ]
@@ -0,0 +1,133 @@
+from django.db import migrations
+
+POSTGRES_FUNCTION = """
+    CREATE OR REPLACE FUNCTION recipes_recipe_search_vector_update()
+    RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('russian', {name}), 'A')
+            || setweight(to_tsvector('simple', {name}), 'A')
+            || setweight(to_tsvector('russian', {text}), 'B')
+            || setweight(to_tsvector('simple', {text}), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+POSTGRES_FORWARD = (
+    POSTGRES_FUNCTION.format(
+        name="translate(coalesce(NEW.name, ''), 'ёЁ', 'еЕ')",
+        text="translate(coalesce(NEW.text, ''), 'ёЁ', 'еЕ')"),
+    'UPDATE recipes_recipe SET name = name',
+)
+
+POSTGRES_BACKWARD = (
+    POSTGRES_FUNCTION.format(name="coalesce(NEW.name, '')",
+                             text="coalesce(NEW.text, '')"),
+    'UPDATE recipes_recipe SET name = name',
+)
+
+SQLITE_DROP = (
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_insert',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_delete',
+    'DROP TRIGGER IF EXISTS recipes_recipe_fts_update',
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+)
+
+SQLITE_FORWARD = SQLITE_DROP + (
+    "CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5("
+    "name, text, tokenize='unicode61 remove_diacritics 2')",
+    """
+    CREATE TRIGGER recipes_recipe_fts_insert
+    AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts(rowid, name, text) VALUES (
+            new.id,
+            replace(replace(new.name, 'ё', 'е'), 'Ё', 'Е'),
+            replace(replace(new.text, 'ё', 'е'), 'Ё', 'Е'));
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_fts_delete
+    AFTER DELETE ON recipes_recipe BEGIN
+        DELETE FROM recipes_recipe_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_fts_update
+    AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        DELETE FROM recipes_recipe_fts WHERE rowid = old.id;
+        INSERT INTO recipes_recipe_fts(rowid, name, text) VALUES (
+            new.id,
+            replace(replace(new.name, 'ё', 'е'), 'Ё', 'Е'),
+            replace(replace(new.text, 'ё', 'е'), 'Ё', 'Е'));
+    END
+    """,
+    """
+    INSERT INTO recipes_recipe_fts(rowid, name, text)
+    SELECT id,
+           replace(replace(name, 'ё', 'е'), 'Ё', 'Е'),
+           replace(replace(text, 'ё', 'е'), 'Ё', 'Е')
+    FROM recipes_recipe
+    """,
+)
+
+SQLITE_BACKWARD = SQLITE_DROP + (
+    "CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5("
+    "name, text, content='recipes_recipe', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    """
+    CREATE TRIGGER recipes_recipe_fts_insert
+    AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_fts_delete
+    AFTER DELETE ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER recipes_recipe_fts_update
+    AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts(recipes_recipe_fts, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO recipes_recipe_fts(rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    "INSERT INTO recipes_recipe_fts(recipes_recipe_fts) VALUES ('rebuild')",
+)
+
+STATEMENTS = {
+    'postgresql': (POSTGRES_FORWARD, POSTGRES_BACKWARD),
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+}
+
+
+def execute(schema_editor, index):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if statements:
+        for statement in statements[index]:
+            schema_editor.execute(statement)
+
+
+def fold_yo(apps, schema_editor):
+    execute(schema_editor, 0)
+
+
+def unfold_yo(apps, schema_editor):
+    execute(schema_editor, 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_data_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(fold_yo, unfold_yo),
+    ]
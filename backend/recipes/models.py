@@ -2,12 +2,34 @@ from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.db import models
 
-from .constants import (MAX_LENGTH, MAX_LENGTH_INGREDIENT,
+from .constants import (MAX_LENGTH, MAX_LENGTH_FILE_NAME, MAX_LENGTH_FORMAT,
+                        MAX_LENGTH_INGREDIENT, MAX_LENGTH_JOB_KEY,
                         MAX_LENGTH_MEASURMENT_UNIT, MAX_LENGTH_RECIPE,
-                        MAX_LENGTH_ROLE, MAX_LENGTH_TAG)
+                        MAX_LENGTH_ROLE, MAX_LENGTH_TAG,
+                        MAX_LENGTH_VERSION_KEY)
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """
+    Не даёт обычному save() перезаписывать денормализованные счётчики.
+
+    Счётчики меняются только через F() (см. recipes.counters), поэтому
+    сохранение загруженного ранее объекта обновляет все поля, кроме них.
+    """
+    COUNTER_FIELDS = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CounterFieldsMixin, AbstractUser):
     """
     Модель пользователя.
     """
@@ -18,6 +40,12 @@ class User(AbstractUser):
     avatar = models.ImageField(upload_to='profiles',
                                blank=True, null=True,
                                default=None)
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False)
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False)
+
+    COUNTER_FIELDS = ('recipes_count', 'followers_count')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -60,7 +88,7 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
     """
     Модель рецепта.
     """
@@ -82,6 +110,14 @@ class Recipe(models.Model):
     )
     pub_date = models.DateTimeField('Дата публикации',
                                     auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False)
+    in_cart_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False)
+    short_link_hits = models.PositiveIntegerField(
+        'Переходов по короткой ссылке', default=0, editable=False)
+
+    COUNTER_FIELDS = ('favorites_count', 'in_cart_count', 'short_link_hits')
 
     class Meta:
         verbose_name = "Рецепт"
@@ -187,3 +223,73 @@ class Subscription(models.Model):
 
     def __str__(self):
         return f"{self.user.username} подписан на {self.author.username}"
+
+
+class ExportJob(models.Model):
+    """
+    Задача фоновой выгрузки списка покупок.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Готово'
+        FAILED = 'failed', 'Ошибка'
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='export_jobs')
+    export_format = models.CharField('Формат', max_length=MAX_LENGTH_FORMAT)
+    detailed = models.BooleanField('С разбивкой по рецептам', default=False)
+    key = models.CharField('Ключ выгрузки', max_length=MAX_LENGTH_JOB_KEY,
+                           db_index=True)
+    status = models.CharField('Статус', max_length=MAX_LENGTH_FORMAT,
+                              choices=Status.choices, default=Status.PENDING,
+                              db_index=True)
+    result = models.BinaryField('Документ', null=True, editable=False)
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    started_at = models.DateTimeField('Начата', null=True, blank=True)
+    finished_at = models.DateTimeField('Завершена', null=True, blank=True)
+    expires_at = models.DateTimeField('Хранится до', null=True, blank=True,
+                                      db_index=True)
+
+    class Meta:
+        ordering = ('created',)
+        verbose_name = "Задача выгрузки"
+        verbose_name_plural = "Задачи выгрузки"
+
+    def __str__(self):
+        return f"Выгрузка {self.export_format} для {self.user.username}"
+
+
+class DataVersion(models.Model):
+    """
+    Версия данных для инвалидации кэшей (см. recipes.versions).
+    """
+    key = models.CharField('Ключ', max_length=MAX_LENGTH_VERSION_KEY,
+                           primary_key=True)
+    version = models.BigIntegerField('Версия')
+
+    class Meta:
+        verbose_name = "Версия данных"
+        verbose_name_plural = "Версии данных"
+
+    def __str__(self):
+        return f"{self.key}={self.version}"
+
+
+class StoredFile(models.Model):
+    """
+    Файл хранилища с адресацией по содержимому (см. recipes.storage).
+    Строка служит блокировкой: запись и удаление файла выполняются,
+    только пока она заблокирована текущей транзакцией.
+    """
+    name = models.CharField('Имя файла', max_length=MAX_LENGTH_FILE_NAME,
+                            primary_key=True)
+    locked_at = models.DateTimeField('Последняя блокировка')
+
+    class Meta:
+        verbose_name = "Файл хранилища"
+        verbose_name_plural = "Файлы хранилища"
+
+    def __str__(self):
+        return self.name
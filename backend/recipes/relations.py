@@ -0,0 +1,95 @@
+"""
+Добавление и удаление рецептов в избранное и список покупок.
+
+Добавление выполняется одним INSERT ... ON CONFLICT DO NOTHING
+RETURNING (то же, что bulk_create(ignore_conflicts=True), но база
+сообщает, какие строки вставлены на самом деле). Поэтому счётчики
+и ответ основаны на фактически добавленных связях, даже если
+одновременный запрос вставил часть из них. Удаление так же выполняется
+одним DELETE ... RETURNING. Ни INSERT, ни DELETE не отправляют
+сигналов, так что счётчики и версия пользователя обновляются здесь
+один раз на всю пачку.
+"""
+from django.db import connection, transaction
+
+from .counters import adjust_counter
+from .models import Recipe
+from .versions import bump_users
+
+
+def insert_relations(model, user, recipe_ids):
+    """
+    Вставляет связи с существующими рецептами из recipe_ids и
+    возвращает множество рецептов, связи с которыми действительно
+    добавлены.
+    """
+    meta = model._meta
+    quote = connection.ops.quote_name
+    user_column = quote(meta.get_field('user').column)
+    recipe_column = quote(meta.get_field('recipe').column)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(meta.db_table)} '
+            f'({user_column}, {recipe_column}) '
+            f'SELECT %s, id FROM {quote(Recipe._meta.db_table)} '
+            f'WHERE id IN ({placeholders}) '
+            f'ON CONFLICT ({user_column}, {recipe_column}) DO NOTHING '
+            f'RETURNING {recipe_column}',
+            [user.pk, *sorted(recipe_ids)])
+        return {row[0] for row in cursor.fetchall()}
+
+
+def add_relations(model, user, recipe_ids):
+    """
+    Добавляет связи user с рецептами recipe_ids.
+    Возвращает множества (добавленные, уже существовавшие, не найденные).
+    """
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return set(), set(), set()
+    with transaction.atomic():
+        added = insert_relations(model, user, recipe_ids)
+        found = added | set(Recipe.objects.filter(
+            pk__in=recipe_ids - added).values_list('id', flat=True))
+        if added:
+            adjust_counter(model, added, 1)
+    if added:
+        bump_users([user.pk])
+    return added, found - added, recipe_ids - found
+
+
+def delete_relations(model, user, recipe_ids):
+    """
+    Удаляет связи user с рецептами из recipe_ids и возвращает
+    множество рецептов, связи с которыми действительно удалены.
+    """
+    meta = model._meta
+    quote = connection.ops.quote_name
+    recipe_column = quote(meta.get_field('recipe').column)
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(meta.db_table)} '
+            f'WHERE {quote(meta.get_field("user").column)} = %s '
+            f'AND {recipe_column} IN ({placeholders}) '
+            f'RETURNING {recipe_column}',
+            [user.pk, *sorted(recipe_ids)])
+        return {row[0] for row in cursor.fetchall()}
+
+
+def remove_relations(model, user, recipe_ids):
+    """
+    Удаляет связи user с рецептами recipe_ids.
+    Возвращает множество рецептов, связи с которыми были удалены.
+    """
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return set()
+    with transaction.atomic():
+        removed = delete_relations(model, user, recipe_ids)
+        if removed:
+            adjust_counter(model, removed, -1)
+    if removed:
+        bump_users([user.pk])
+    return removed
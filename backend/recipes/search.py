@@ -0,0 +1,106 @@
+"""
+Полнотекстовый поиск рецептов по названию и описанию.
+
+В PostgreSQL у таблицы рецептов есть столбец search_vector (tsvector)
+с GIN-индексом; его заполняет триггер при каждой вставке и изменении
+name или text, в том числе при bulk_create. Вектор объединяет
+конфигурации russian (со стеммингом) и simple (точные формы слов).
+
+В SQLite (режим DEBUG) вместо него используется виртуальная таблица
+FTS5 recipes_recipe_fts, которую поддерживают триггеры. При изменении
+схемы SQLite пересоздаёт таблицу рецептов и теряет её триггеры,
+поэтому они восстанавливаются после миграций.
+
+И в индексе, и в запросе ё заменяется на е. Таблицу, функцию
+и триггеры создают миграции 0003 и 0007.
+"""
+import re
+
+from django.db import connection, connections
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+SQLITE_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_insert
+    AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts(rowid, name, text) VALUES (
+            new.id,
+            replace(replace(new.name, 'ё', 'е'), 'Ё', 'Е'),
+            replace(replace(new.text, 'ё', 'е'), 'Ё', 'Е'));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_delete
+    AFTER DELETE ON recipes_recipe BEGIN
+        DELETE FROM recipes_recipe_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS recipes_recipe_fts_update
+    AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        DELETE FROM recipes_recipe_fts WHERE rowid = old.id;
+        INSERT INTO recipes_recipe_fts(rowid, name, text) VALUES (
+            new.id,
+            replace(replace(new.name, 'ё', 'е'), 'Ё', 'Е'),
+            replace(replace(new.text, 'ё', 'е'), 'Ё', 'Е'));
+    END
+    """,
+)
+
+POSTGRES_QUERY = ("(websearch_to_tsquery('russian', %s) "
+                  "|| websearch_to_tsquery('simple', %s))")
+
+
+def restore_sqlite_triggers(using='default', **kwargs):
+    """Восстанавливает триггеры FTS5 после пересоздания таблицы."""
+    conn = connections[using]
+    if conn.vendor != 'sqlite':
+        return
+    if 'recipes_recipe_fts' not in conn.introspection.table_names():
+        return
+    with conn.cursor() as cursor:
+        for statement in SQLITE_TRIGGERS:
+            cursor.execute(statement)
+
+
+def fold_yo(text):
+    """Заменяет ё на е, как это делают триггеры при индексации."""
+    return text.replace('ё', 'е').replace('Ё', 'Е')
+
+
+def fts5_query(query):
+    """Превращает ввод пользователя в безопасный запрос FTS5."""
+    words = re.findall(r'\w+', fold_yo(query))
+    return ' '.join('"%s"' % word for word in words)
+
+
+def search_recipes(queryset, query):
+    """
+    Оставляет рецепты, подходящие под запрос, и сортирует их
+    по релевантности (аннотация search_rank).
+    """
+    if connection.vendor == 'postgresql':
+        params = (fold_yo(query),) * 2
+        matches = RawSQL(
+            'SELECT id FROM recipes_recipe '
+            f'WHERE search_vector @@ {POSTGRES_QUERY}', params)
+        rank = RawSQL(
+            f'ts_rank(recipes_recipe.search_vector, {POSTGRES_QUERY})',
+            params, output_field=FloatField())
+    elif connection.vendor == 'sqlite':
+        query = fts5_query(query)
+        if not query:
+            return queryset.none()
+        matches = RawSQL(
+            'SELECT rowid FROM recipes_recipe_fts '
+            'WHERE recipes_recipe_fts MATCH %s', (query,))
+        rank = RawSQL(
+            'SELECT -bm25(recipes_recipe_fts) FROM recipes_recipe_fts '
+            'WHERE recipes_recipe_fts MATCH %s '
+            'AND recipes_recipe_fts.rowid = recipes_recipe.id',
+            (query,), output_field=FloatField())
+    else:
+        return queryset.filter(name__icontains=query)
+    return queryset.filter(pk__in=matches).annotate(
+        search_rank=rank).order_by('-search_rank', '-pub_date')
@@ -0,0 +1,114 @@
+"""
+Короткие ссылки на рецепты.
+
+Переход по короткой ссылке не обращается к базе: существование
+рецепта кэшируется (несуществующие id — на короткое время), а
+переходы считаются в памяти процесса и сбрасываются в
+Recipe.short_link_hits пачками — по SHORT_LINK_FLUSH_SIZE переходов
+или раз в SHORT_LINK_FLUSH_INTERVAL секунд, а также при завершении
+процесса.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+import short_url
+from django.core.cache import cache
+from django.db import DatabaseError, transaction
+from django.db.models import F
+
+from .constants import (SHORT_LINK_CACHE_TIMEOUT, SHORT_LINK_FLUSH_INTERVAL,
+                        SHORT_LINK_FLUSH_SIZE, SHORT_LINK_MISS_TIMEOUT)
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+
+def exists_key(recipe_id):
+    return f'recipe-exists:{recipe_id}'
+
+
+@lru_cache(maxsize=10000)
+def short_code(recipe_id):
+    return short_url.encode_url(recipe_id)
+
+
+def decode_short_code(code):
+    """Возвращает id рецепта или None для некорректного кода."""
+    try:
+        return short_url.decode_url(code)
+    except ValueError:
+        return None
+
+
+def recipe_exists(recipe_id):
+    exists = cache.get(exists_key(recipe_id))
+    if exists is None:
+        exists = Recipe.objects.filter(pk=recipe_id).exists()
+        cache.set(exists_key(recipe_id), exists,
+                  SHORT_LINK_CACHE_TIMEOUT if exists
+                  else SHORT_LINK_MISS_TIMEOUT)
+    return exists
+
+
+def forget_recipe(recipe_id):
+    cache.delete(exists_key(recipe_id))
+
+
+class HitCounter:
+    """Накопитель переходов, сбрасываемый в базу пачками."""
+
+    def __init__(self, flush_size=SHORT_LINK_FLUSH_SIZE,
+                 flush_interval=SHORT_LINK_FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.hits = Counter()
+        self.pending = 0
+        self.flushed_at = time.monotonic()
+
+    def record(self, recipe_id):
+        with self.lock:
+            self.hits[recipe_id] += 1
+            self.pending += 1
+            due = (self.pending >= self.flush_size
+                   or time.monotonic() - self.flushed_at
+                   >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Записывает накопленные переходы одной транзакцией. При ошибке
+        базы переходы возвращаются в накопитель и будут записаны
+        следующей попыткой — не раньше чем через flush_size переходов
+        или flush_interval секунд. Возвращает, удалась ли запись.
+        """
+        with self.lock:
+            hits, self.hits = self.hits, Counter()
+            self.pending = 0
+            self.flushed_at = time.monotonic()
+        if not hits:
+            return True
+        by_count = {}
+        for recipe_id, count in hits.items():
+            by_count.setdefault(count, []).append(recipe_id)
+        try:
+            with transaction.atomic():
+                for count, ids in by_count.items():
+                    Recipe.objects.filter(pk__in=ids).update(
+                        short_link_hits=F('short_link_hits') + count)
+        except DatabaseError:
+            logger.exception(
+                'Не удалось сохранить переходы по коротким ссылкам')
+            with self.lock:
+                self.hits.update(hits)
+            return False
+        return True
+
+
+hit_counter = HitCounter()
+atexit.register(hit_counter.flush)
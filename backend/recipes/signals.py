@@ -0,0 +1,148 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from .counters import adjust_counter, get_counter
+from .images import build_derivatives, has_derivatives, release_image
+from .models import (FavoriteRecipe, Ingredient, IngredientInRecipe, Recipe,
+                     RecipeTag, ShoppingCart, Subscription, Tag, User)
+from .short_links import forget_recipe
+from .versions import bump_recipes, bump_tables, bump_users
+
+PROFILE_FIELDS = {'email', 'username', 'first_name', 'last_name', 'avatar'}
+IMAGE_FIELDS = {Recipe: 'image', User: 'avatar'}
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    bump_recipes([instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_existence_changed(sender, instance, created=True, **kwargs):
+    """Сбрасывает закэшированное существование для коротких ссылок."""
+    if created:
+        forget_recipe(instance.pk)
+
+
+@receiver(post_save, sender=RecipeTag)
+@receiver(post_delete, sender=RecipeTag)
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def recipe_relation_changed(sender, instance, **kwargs):
+    bump_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_recipes([instance.pk])
+    elif pk_set:
+        bump_recipes(pk_set)
+    else:
+        bump_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, update_fields, **kwargs):
+    """Профиль автора входит в представление каждого его рецепта."""
+    if created or (update_fields and not PROFILE_FIELDS & set(update_fields)):
+        return
+    bump_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def catalog_item_changed(sender, instance, created, **kwargs):
+    bump_tables(sender._meta.model_name + 's')
+    if not created:
+        bump_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def catalog_item_deleted(sender, instance, **kwargs):
+    bump_tables(sender._meta.model_name + 's')
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def user_flags_changed(sender, instance, **kwargs):
+    bump_users([instance.user_id])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+def counted_object_created(sender, instance, created, **kwargs):
+    if created:
+        fk_name = get_counter(sender)[0]
+        adjust_counter(sender, [getattr(instance, f'{fk_name}_id')], 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+def counted_object_deleted(sender, instance, **kwargs):
+    fk_name = get_counter(sender)[0]
+    adjust_counter(sender, [getattr(instance, f'{fk_name}_id')], -1)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def image_saved(sender, instance, update_fields, **kwargs):
+    """
+    Строит уменьшенные копии для нового изображения
+    и освобождает заменённое.
+    """
+    field_name = IMAGE_FIELDS[sender]
+    if update_fields and field_name not in update_fields:
+        return
+    field_file = getattr(instance, field_name)
+    if field_file and not has_derivatives(field_file.name):
+        try:
+            build_derivatives(field_file.name)
+        except OSError:
+            # Повреждённый или пропавший файл не должен мешать
+            # сохранению; копии можно построить позже командой
+            # build_image_derivatives.
+            logger.exception('Не удалось построить копии %s',
+                             field_file.name)
+    replaced = getattr(instance, '_replaced_image', None)
+    if replaced and replaced != field_file.name:
+        transaction.on_commit(lambda: release_image(replaced))
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def image_replacing(sender, instance, update_fields, **kwargs):
+    field_name = IMAGE_FIELDS[sender]
+    instance._replaced_image = None
+    if instance.pk is None or (
+            update_fields and field_name not in update_fields):
+        return
+    instance._replaced_image = sender.objects.filter(
+        pk=instance.pk).values_list(field_name, flat=True).first()
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def image_owner_deleted(sender, instance, **kwargs):
+    name = getattr(instance, IMAGE_FIELDS[sender]).name
+    if name:
+        transaction.on_commit(lambda: release_image(name))
@@ -0,0 +1,67 @@
+"""
+Хранилище медиафайлов с адресацией по содержимому.
+
+Изображения рецептов и аватары сохраняются под именем
+<каталог>/<первые 2 символа хэша>/<sha256 содержимого><расширение>.
+Одинаковое содержимое записывается один раз, а URL файла никогда не
+меняет содержимое, поэтому nginx отдаёт такие файлы с бессрочным
+кэшированием. Файлы остальных каталогов (например, derivatives/)
+сохраняются как в обычном FileSystemStorage.
+
+Один файл может понадобиться новой записи в тот момент, когда
+recipes.images.release_image удаляет его как никому не нужный.
+Поэтому запись и удаление сначала блокируют строку StoredFile с именем
+файла до конца транзакции (lock_file). Сохранение внутри транзакции
+держит блокировку, пока запись со ссылкой на файл не зафиксирована,
+а удаление проверяет ссылки уже под блокировкой.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+from .models import StoredFile
+
+CONTENT_ADDRESSED_DIRS = ('recipes', 'profiles')
+
+
+def lock_file(name):
+    """
+    Блокирует имя файла до конца текущей транзакции. Строка всегда
+    изменяется, поэтому блокировку получает и SQLite.
+    """
+    now = timezone.now()
+    if StoredFile.objects.filter(name=name).update(locked_at=now):
+        return
+    StoredFile.objects.bulk_create(
+        [StoredFile(name=name, locked_at=now)], ignore_conflicts=True)
+    StoredFile.objects.filter(name=name).update(locked_at=now)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def is_content_addressed(self, name):
+        return name.replace('\\', '/').split('/', 1)[0] in (
+            CONTENT_ADDRESSED_DIRS)
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory = name.replace('\\', '/').split('/', 1)[0]
+        extension = os.path.splitext(name)[1].lower()
+        digest = digest.hexdigest()
+        return f'{directory}/{digest[:2]}/{digest}{extension}'
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not self.is_content_addressed(name):
+            return super().save(name, content, max_length)
+        name = self.content_name(name, content)
+        lock_file(name)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
@@ -0,0 +1,96 @@
+"""
+Версии данных для инвалидации кэшей.
+
+Версия — метка времени в наносекундах, которая хранится в таблице
+DataVersion под ключом объекта и увеличивается при каждом изменении
+его данных. Закэшированные значения строятся с версией в ключе, поэтому
+смена версии делает старые записи недоступными без их удаления.
+Версии лежат в базе, а не в кэше процесса, поэтому изменения из команд
+импорта и фоновых задач сразу видны всем веб-процессам.
+
+Внутри транзакции версии меняются только после её фиксации: иначе
+параллельный запрос успел бы закэшировать под новой версией данные,
+которые ещё не зафиксированы.
+"""
+import time
+
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+
+from .constants import VERSION_BATCH_SIZE
+from .models import DataVersion
+
+
+def recipe_key(recipe_id):
+    return f'version:recipe:{recipe_id}'
+
+
+def table_key(name):
+    return f'version:table:{name}'
+
+
+def user_key(user_id):
+    """Версия флагов пользователя: избранного, покупок и подписок."""
+    return f'version:user:{user_id}'
+
+
+def chunked(keys):
+    keys = sorted(set(keys))
+    for start in range(0, len(keys), VERSION_BATCH_SIZE):
+        yield keys[start:start + VERSION_BATCH_SIZE]
+
+
+def get_versions(keys):
+    """
+    Возвращает словарь {ключ: версия}. Ключ без записи имеет версию 0:
+    запись создаёт только write_versions, поэтому чтение не растит
+    таблицу, какие бы ключи ни запрашивались.
+    """
+    keys = set(keys)
+    versions = dict.fromkeys(keys, 0)
+    for chunk in chunked(keys):
+        versions.update(DataVersion.objects.filter(
+            key__in=chunk).values_list('key', 'version'))
+    return versions
+
+
+def get_version(key):
+    return get_versions([key])[key]
+
+
+def bump_versions(keys):
+    """
+    Назначает ключам новые версии после фиксации текущей транзакции
+    (вне транзакции — сразу).
+    """
+    keys = list(keys)
+    transaction.on_commit(lambda: write_versions(keys))
+
+
+def write_versions(keys):
+    """
+    Записывает ключам новые версии. Версия растёт строго монотонно,
+    даже если часы процессов расходятся.
+    """
+    version = time.time_ns()
+    for chunk in chunked(keys):
+        updated = DataVersion.objects.filter(key__in=chunk).update(
+            version=Greatest(F('version') + 1, Value(version)))
+        if updated < len(chunk):
+            DataVersion.objects.bulk_create(
+                [DataVersion(key=key, version=version) for key in chunk],
+                ignore_conflicts=True)
+
+
+def bump_recipes(recipe_ids):
+    bump_versions([table_key('recipes')] + [
+        recipe_key(recipe_id) for recipe_id in set(recipe_ids)])
+
+
+def bump_tables(*names):
+    bump_versions(table_key(name) for name in names)
+
+
+def bump_users(user_ids):
+    bump_versions(user_key(user_id) for user_id in set(user_ids))
@@ -0,0 +1,85 @@
+import shutil
+
+import pytest
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Ingredient, IngredientInRecipe, Recipe, RecipeTag,
+                            Tag)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    yield
+    for cache in caches.all():
+        cache.clear()
+    shutil.rmtree(settings.EXPORT_CACHE_LOCATION, ignore_errors=True)
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        email='cook@example.com', username='cook', password='pass',
+        first_name='Иван', last_name='Поваров')
+
+
+@pytest.fixture
+def other_user(django_user_model):
+    return django_user_model.objects.create_user(
+        email='guest@example.com', username='guest', password='pass',
+        first_name='Пётр', last_name='Гостев')
+
+
+@pytest.fixture
+def client():
+    return APIClient()
+
+
+@pytest.fixture
+def user_client(user):
+    client = APIClient()
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+    return client
+
+
+@pytest.fixture
+def tags():
+    return [Tag.objects.create(name=f'Тег {number}', slug=f'tag{number}')
+            for number in range(3)]
+
+
+@pytest.fixture
+def ingredients():
+    return [Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(10)]
+
+
+@pytest.fixture
+def make_recipes(user, tags, ingredients):
+    def make(count, author=None):
+        recipes = [
+            Recipe.objects.create(name=f'Рецепт {number}', text='Описание',
+                                  cooking_time=number + 1,
+                                  author=author or user)
+            for number in range(count)
+        ]
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe=recipe, tag=tag)
+            for recipe in recipes for tag in tags[:2]
+        ])
+        IngredientInRecipe.objects.bulk_create([
+            IngredientInRecipe(recipe=recipe, ingredient=ingredient,
+                               amount=10)
+            for recipe in recipes for ingredient in ingredients[:3]
+        ])
+        return recipes
+    return make
+
+
+@pytest.fixture
+def recipe(make_recipes):
+    return make_recipes(1)[0]
@@ -0,0 +1,22 @@
+import pytest
+
+from recipes.catalog_import import import_catalog
+from recipes.models import Tag
+
+
+@pytest.mark.django_db
+def test_conflicting_rows_are_reported_as_skipped():
+    Tag.objects.create(name='Завтрак', slug='breakfast')
+    counts = import_catalog(
+        Tag, [('Утро', 'breakfast'), ('Обед', 'lunch')], ('name', 'slug'))
+    assert counts == {'inserted': 1, 'updated': 0, 'skipped': 1}
+    assert set(Tag.objects.values_list('name', flat=True)) == {
+        'Завтрак', 'Обед'}
+
+
+@pytest.mark.django_db
+def test_repeated_import_changes_nothing():
+    rows = [('Утро', 'morning'), ('Обед', 'lunch')]
+    assert import_catalog(Tag, rows, ('name', 'slug'))['inserted'] == 2
+    assert import_catalog(Tag, rows, ('name', 'slug')) == {
+        'inserted': 0, 'updated': 0, 'skipped': 2}
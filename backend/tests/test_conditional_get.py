@@ -0,0 +1,21 @@
+import pytest
+
+from recipes.models import DataVersion
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('pk', ['junk0', '9' * 60])
+def test_unknown_recipe_does_not_create_versions(client, pk):
+    response = client.get(f'/api/recipes/{pk}/')
+    assert response.status_code == 404
+    assert not DataVersion.objects.exists()
+
+
+@pytest.mark.django_db
+def test_unchanged_recipe_is_not_modified(client, recipe):
+    response = client.get(f'/api/recipes/{recipe.pk}/')
+    assert response.status_code == 200
+    again = client.get(f'/api/recipes/{recipe.pk}/',
+                       HTTP_IF_NONE_MATCH=response['ETag'])
+    assert again.status_code == 304
+    assert not DataVersion.objects.exists()
@@ -0,0 +1,153 @@
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils import timezone
+
+from api.export_cache import export_cache
+from api.jobs import (claim_job, claim_pending_jobs, enqueue_export,
+                      purge_expired_jobs, requeue_stale_jobs, run_job)
+from api.shopping_list import get_cart_export_key
+from recipes.models import ExportJob, ShoppingCart
+
+Status = ExportJob.Status
+DOWNLOAD_URL = '/api/recipes/download_shopping_cart/'
+
+
+@pytest.fixture
+def cart(user, recipe):
+    return ShoppingCart.objects.create(user=user, recipe=recipe)
+
+
+def enqueue(client, **params):
+    response = client.get(DOWNLOAD_URL, {'async': '1', **params})
+    assert response.status_code == 202
+    return response
+
+
+@pytest.mark.django_db
+def test_enqueue_returns_pending_job(user_client, cart):
+    response = enqueue(user_client, format='txt')
+    job = ExportJob.objects.get()
+    assert response.data['id'] == job.pk
+    assert response.data['status'] == Status.PENDING
+    assert response.data['download_url'] is None
+    assert response['Location'].endswith(f'/api/export-jobs/{job.pk}/')
+
+
+@pytest.mark.django_db
+def test_enqueue_deduplicates_same_export(user, user_client, cart):
+    first = enqueue(user_client, format='txt').data['id']
+    assert enqueue(user_client, format='txt').data['id'] == first
+    assert enqueue(user_client, format='csv').data['id'] != first
+    assert enqueue_export(user, 'txt', False).pk == first
+    assert ExportJob.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_failed_and_expired_jobs_are_not_reused(user, cart):
+    failed = enqueue_export(user, 'txt', False)
+    ExportJob.objects.filter(pk=failed.pk).update(status=Status.FAILED)
+    expired = enqueue_export(user, 'txt', False)
+    assert expired.pk != failed.pk
+    ExportJob.objects.filter(pk=expired.pk).update(
+        status=Status.DONE, expires_at=timezone.now() - timedelta(seconds=1))
+    assert enqueue_export(user, 'txt', False).pk not in (
+        failed.pk, expired.pk)
+
+
+@pytest.mark.django_db
+def test_job_is_claimed_once(user, cart):
+    job = enqueue_export(user, 'txt', False)
+    assert claim_job(job.pk)
+    assert not claim_job(job.pk)
+    assert claim_pending_jobs(10) == []
+    job.refresh_from_db()
+    assert job.status == Status.RUNNING
+    assert job.started_at is not None
+
+
+@pytest.mark.django_db
+def test_claim_pending_jobs_respects_limit_and_order(user, cart):
+    jobs = [enqueue_export(user, export_format, False)
+            for export_format in ('txt', 'csv', 'json')]
+    assert claim_pending_jobs(2) == [jobs[0].pk, jobs[1].pk]
+    assert claim_pending_jobs(2) == [jobs[2].pk]
+
+
+@pytest.mark.django_db
+def test_stale_running_job_is_requeued(user, cart, settings):
+    job = enqueue_export(user, 'txt', False)
+    claim_job(job.pk)
+    assert requeue_stale_jobs() == 0
+    ExportJob.objects.filter(pk=job.pk).update(
+        started_at=timezone.now() - timedelta(
+            seconds=settings.EXPORT_JOB_TIMEOUT + 1))
+    assert requeue_stale_jobs() == 1
+    assert claim_pending_jobs(1) == [job.pk]
+
+
+@pytest.mark.django_db
+def test_expired_jobs_are_hidden_and_purged(user, user_client, cart):
+    job = enqueue_export(user, 'txt', False)
+    claim_job(job.pk)
+    run_job(job.pk)
+    assert user_client.get(f'/api/export-jobs/{job.pk}/').status_code == 200
+    ExportJob.objects.filter(pk=job.pk).update(
+        expires_at=timezone.now() - timedelta(seconds=1))
+    assert user_client.get(f'/api/export-jobs/{job.pk}/').status_code == 404
+    assert user_client.get('/api/export-jobs/').data['results'] == []
+    assert purge_expired_jobs() == 1
+    assert not ExportJob.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_worker_runs_job_and_result_is_downloadable(user_client, cart):
+    job_id = enqueue(user_client, format='txt').data['id']
+    pending = user_client.get(f'/api/export-jobs/{job_id}/download/')
+    assert pending.status_code == 409
+
+    call_command('run_export_jobs', '--once', '--workers', '1')
+
+    job = user_client.get(f'/api/export-jobs/{job_id}/')
+    assert job.data['status'] == Status.DONE
+    assert job.data['download_url'].endswith(
+        f'/api/export-jobs/{job_id}/download/')
+    response = user_client.get(f'/api/export-jobs/{job_id}/download/')
+    assert response.status_code == 200
+    assert response['Content-Disposition'] == (
+        'attachment; filename="shopping_cart.txt"')
+    synchronous = user_client.get(DOWNLOAD_URL, {'format': 'txt'})
+    assert response.content == b''.join(synchronous.streaming_content)
+
+
+@pytest.mark.django_db
+def test_other_users_jobs_are_hidden(user, other_user, client, cart):
+    job = enqueue_export(user, 'txt', False)
+    client.force_authenticate(other_user)
+    assert client.get(f'/api/export-jobs/{job.pk}/').status_code == 404
+    assert client.get(
+        f'/api/export-jobs/{job.pk}/download/').status_code == 404
+
+
+@pytest.mark.django_db
+def test_job_caches_cart_as_rendered(user, cart, make_recipes):
+    job = enqueue_export(user, 'txt', False)
+    queued_key = job.key
+    ShoppingCart.objects.create(user=user, recipe=make_recipes(1)[0])
+    claim_job(job.pk)
+    run_job(job.pk)
+
+    job.refresh_from_db()
+    current_key = get_cart_export_key(user, 'txt', False)
+    assert job.key == current_key != queued_key
+    assert export_cache.get(queued_key) is None
+    assert export_cache.get(current_key) == bytes(job.result)
+
+
+@pytest.mark.django_db
+def test_eager_mode_runs_job_immediately(user, cart, settings):
+    settings.EXPORT_JOBS_EAGER = True
+    job = enqueue_export(user, 'json', True)
+    assert job.status == Status.DONE
+    assert b'"recipes"' in bytes(job.result)
@@ -0,0 +1,45 @@
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from recipes.models import FavoriteRecipe, Recipe, User
+
+SMALL = ('--users', '5', '--recipes', '10', '--ingredients', '20',
+         '--favorites', '15', '--cart', '5', '--subscriptions', '5',
+         '--tags', '3')
+
+
+def generate(*args):
+    call_command('generate_fake_data', *SMALL, *args)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('args', [
+    ('--tags', '0'),
+    ('--ingredients-per-recipe', '0'),
+    ('--users', '0'),
+    ('--recipes', '0'),
+    ('--favorites', '-1'),
+    ('--batch-size', '0'),
+])
+def test_invalid_options_fail_before_writing(args):
+    with pytest.raises(CommandError):
+        generate(*args)
+    assert not User.objects.exists()
+
+
+@pytest.mark.django_db
+def test_empty_ingredient_catalog_is_rejected():
+    with pytest.raises(CommandError, match='Справочник ингредиентов пуст'):
+        generate('--ingredients', '0')
+    assert not User.objects.exists()
+
+
+@pytest.mark.django_db
+def test_small_dataset_is_generated():
+    generate()
+    assert User.objects.count() == 5
+    assert Recipe.objects.count() == 10
+    assert all(recipe.tags.exists() and recipe.ingredients.exists()
+               for recipe in Recipe.objects.all())
+    assert FavoriteRecipe.objects.exists()
@@ -0,0 +1,81 @@
+from io import BytesIO, StringIO
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from PIL import Image
+
+from recipes.images import (delete_derivatives, derivative_name,
+                            has_derivatives, release_image)
+from recipes.models import Recipe, StoredFile
+from recipes.versions import get_versions, recipe_key
+
+
+def png(color):
+    buffer = BytesIO()
+    Image.new('RGB', (200, 100), color).save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name='image.png')
+
+
+def make_recipe(user, image):
+    return Recipe.objects.create(name='Рецепт', text='Описание',
+                                 cooking_time=5, author=user, image=image)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_shared_file_is_deleted_with_last_reference(user):
+    first = make_recipe(user, png('red'))
+    second = make_recipe(user, png('red'))
+    name = first.image.name
+    assert second.image.name == name
+    assert default_storage.exists(derivative_name(name, 160, 'webp'))
+
+    first.delete()
+    assert default_storage.exists(name)
+    second.delete()
+    assert not default_storage.exists(name)
+    assert not default_storage.exists(derivative_name(name, 160, 'webp'))
+    assert not StoredFile.objects.filter(name=name).exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_replaced_image_is_released(user):
+    recipe = make_recipe(user, png('green'))
+    old_name = recipe.image.name
+    recipe.image = png('blue')
+    recipe.save()
+    assert recipe.image.name != old_name
+    assert not default_storage.exists(old_name)
+    assert default_storage.exists(recipe.image.name)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_file_saved_again_after_release_is_restored(user):
+    recipe = make_recipe(user, png('white'))
+    name = recipe.image.name
+    Recipe.objects.filter(pk=recipe.pk).update(image='')
+    assert release_image(name)
+    assert not default_storage.exists(name)
+    assert make_recipe(user, png('white')).image.name == name
+    assert default_storage.exists(name)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_backfill_bumps_referencing_recipes(user, other_user):
+    recipe = make_recipe(user, png('black'))
+    untouched = make_recipe(other_user, png('yellow'))
+    user.avatar = png('purple')
+    user.save()
+    authored = make_recipe(user, None)
+    delete_derivatives(recipe.image.name)
+    delete_derivatives(user.avatar.name)
+    keys = [recipe_key(pk) for pk in (recipe.pk, untouched.pk, authored.pk)]
+    before = get_versions(keys)
+
+    call_command('build_image_derivatives', '--processes', '1',
+                 stdout=StringIO())
+
+    assert has_derivatives(recipe.image.name)
+    after = get_versions(keys)
+    assert [after[key] > before[key] for key in keys] == [True, False, True]
@@ -0,0 +1,97 @@
+import csv
+from io import StringIO
+
+import pytest
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import IntegrityError
+from PIL import Image
+
+from recipes.constants import MAX_LENGTH_RECIPE
+from recipes.management.commands import import_recipes
+from recipes.models import Recipe
+
+FIELDS = ('name', 'text', 'cooking_time', 'author_id', 'image', 'tags',
+          'ingredients')
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def row(user, tags, ingredients, name, **fields):
+    return {'name': name, 'text': 'Описание', 'cooking_time': 10,
+            'author_id': user.pk, 'image': '', 'tags': str(tags[0].pk),
+            'ingredients': f'{ingredients[0].pk}:100', **fields}
+
+
+def run_import(path):
+    out = StringIO()
+    call_command('import_recipes', '--file', str(path), '--workers', '1',
+                 stdout=out)
+    return out.getvalue()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_invalid_fields_are_reported_per_row(
+        tmp_path, user, tags, ingredients):
+    path = tmp_path / 'recipes.csv'
+    write_csv(path, [
+        row(user, tags, ingredients, 'Первый'),
+        row(user, tags, ingredients, 'Без времени', cooking_time=0),
+        row(user, tags, ingredients, 'Д' * (MAX_LENGTH_RECIPE + 1)),
+        row(user, tags, ingredients, 'Пустой', text=''),
+        row(user, tags, ingredients, 'Последний'),
+    ])
+    output = run_import(path)
+    assert set(Recipe.objects.values_list('name', flat=True)) == {
+        'Первый', 'Последний'}
+    assert 'Строка 3:' in output
+    assert 'Строка 4:' in output
+    assert 'Строка 5:' in output
+    assert 'добавлено 2, пропущено 0, с ошибками 3' in output
+    user.refresh_from_db()
+    assert user.recipes_count == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_failed_rows_release_their_images(
+        tmp_path, monkeypatch, user, other_user, tags, ingredients):
+    Image.new('RGB', (50, 50), 'red').save(tmp_path / 'shared.png')
+    Image.new('RGB', (50, 50), 'blue').save(tmp_path / 'own.png')
+    path = tmp_path / 'recipes.csv'
+    write_csv(path, [
+        row(user, tags, ingredients, 'Первый', image='shared.png'),
+        row(other_user, tags, ingredients, 'Сломанный', image='own.png'),
+        row(other_user, tags, ingredients, 'Общий', image='shared.png'),
+        row(user, tags, ingredients, 'Последний'),
+    ])
+    adjust_counter = import_recipes.adjust_counter
+
+    def failing_adjust_counter(model, pks, delta):
+        # Ошибка базы на одном из рецептов пачки.
+        if Recipe.objects.filter(name='Сломанный').exists():
+            raise IntegrityError('ошибка вставки')
+        adjust_counter(model, pks, delta)
+
+    monkeypatch.setattr(
+        import_recipes, 'adjust_counter', failing_adjust_counter)
+    output = run_import(path)
+
+    assert set(Recipe.objects.values_list('name', flat=True)) == {
+        'Первый', 'Общий', 'Последний'}
+    assert 'Строка 3: ошибка при добавлении рецепта' in output
+    assert 'добавлено 3, пропущено 0, с ошибками 1' in output
+    shared = Recipe.objects.get(name='Первый').image.name
+    assert Recipe.objects.get(name='Общий').image.name == shared
+    assert default_storage.exists(shared)
+    with open(tmp_path / 'own.png', 'rb') as image_file:
+        own = default_storage.content_name('recipes/own.png', File(image_file))
+    assert not default_storage.exists(own)
+    user.refresh_from_db()
+    other_user.refresh_from_db()
+    assert (user.recipes_count, other_user.recipes_count) == (2, 1)
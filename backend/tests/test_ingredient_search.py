@@ -0,0 +1,34 @@
+import pytest
+
+from recipes.models import Ingredient
+from recipes.versions import bump_tables
+
+SEARCH_URL = '/api/ingredients/'
+
+
+def names(client, query):
+    return [item['name']
+            for item in client.get(SEARCH_URL, {'name': query}).data]
+
+
+@pytest.mark.django_db
+def test_search_follows_table_version(
+        client, ingredients, django_capture_on_commit_callbacks):
+    assert names(client, 'картоф') == []
+    # bulk_create не отправляет сигналов: вставляющий код сам меняет
+    # версию таблицы, как импорт справочника в другом процессе.
+    Ingredient.objects.bulk_create(
+        [Ingredient(name='Картофель', measurement_unit='г')])
+    with django_capture_on_commit_callbacks(execute=True):
+        bump_tables('ingredients')
+    assert names(client, 'картоф') == ['Картофель']
+
+
+@pytest.mark.django_db
+def test_search_does_not_scan_table(
+        client, ingredients, django_assert_num_queries):
+    names(client, 'соль')
+    # Только версия таблицы для ETag; индекс её не перечитывает.
+    with django_assert_num_queries(1):
+        response = client.get(SEARCH_URL, {'name': 'соль'})
+    assert response.status_code == 200
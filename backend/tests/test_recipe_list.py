@@ -0,0 +1,49 @@
+import pytest
+from django.core.cache import cache
+
+from recipes.models import FavoriteRecipe, ShoppingCart, Subscription
+
+# Версии для ETag, версии представлений, слаги тегов для фильтра,
+# COUNT(*), страница рецептов и две предзагрузки: теги и ингредиенты.
+LIST_QUERIES = 7
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('limit', [6, 100])
+def test_recipe_list_queries_do_not_depend_on_page_size(
+        client, make_recipes, django_assert_num_queries, limit):
+    make_recipes(100)
+    client.get('/api/recipes/', {'limit': limit})
+    cache.clear()
+    with django_assert_num_queries(LIST_QUERIES):
+        response = client.get('/api/recipes/', {'limit': limit})
+    assert response.status_code == 200
+    assert len(response.data['results']) == limit
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('limit', [6, 100])
+def test_authenticated_list_queries_do_not_depend_on_page_size(
+        user, other_user, user_client, make_recipes,
+        django_assert_num_queries, limit):
+    recipes = make_recipes(100, author=other_user)
+    FavoriteRecipe.objects.bulk_create(
+        FavoriteRecipe(user=user, recipe=recipe) for recipe in recipes[::3])
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=user, recipe=recipe) for recipe in recipes[::5])
+    Subscription.objects.create(user=user, author=other_user)
+    user_client.get('/api/recipes/', {'limit': limit})
+    cache.clear()
+    # Флаги избранного, корзины и подписки считаются подзапросами
+    # Exists() в запросе страницы; добавляется только токен.
+    with django_assert_num_queries(LIST_QUERIES + 1):
+        response = user_client.get('/api/recipes/', {'limit': limit})
+    assert response.status_code == 200
+    results = response.data['results']
+    assert len(results) == limit
+    favorited = {recipe.pk for recipe in recipes[::3]}
+    in_cart = {recipe.pk for recipe in recipes[::5]}
+    for item in results:
+        assert item['is_favorited'] == (item['id'] in favorited)
+        assert item['is_in_shopping_cart'] == (item['id'] in in_cart)
+        assert item['author']['is_subscribed']
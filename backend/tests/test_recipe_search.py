@@ -0,0 +1,30 @@
+import pytest
+
+from recipes.models import Recipe
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('query', ['свеклой', 'свёклой', 'СВЁКЛОЙ'])
+def test_search_folds_yo(client, user, query):
+    recipe = Recipe.objects.create(
+        name='Салат со свёклой', text='Натереть свёклу.', cooking_time=10,
+        author=user)
+    Recipe.objects.create(
+        name='Борщ', text='Сварить бульон.', cooking_time=90, author=user)
+    response = client.get('/api/recipes/', {'search': query})
+    assert [item['id'] for item in response.data['results']] == [recipe.id]
+
+
+@pytest.mark.django_db
+def test_search_follows_updates_and_deletes(client, user):
+    recipe = Recipe.objects.create(
+        name='Ёжики', text='Тефтели с рисом.', cooking_time=40, author=user)
+    recipe.name = 'Тефтели'
+    recipe.save()
+    assert client.get(
+        '/api/recipes/', {'search': 'ежики'}).data['results'] == []
+    assert client.get(
+        '/api/recipes/', {'search': 'тефтели'}).data['count'] == 1
+    recipe.delete()
+    assert client.get(
+        '/api/recipes/', {'search': 'тефтели'}).data['count'] == 0
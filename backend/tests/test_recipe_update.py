@@ -0,0 +1,92 @@
+from operator import itemgetter
+
+import pytest
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import IngredientInRecipe, RecipeTag
+from recipes.versions import bump_recipes, get_version, recipe_key
+
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+RECIPE_TABLES = ('recipes_recipe"', 'recipes_recipetag',
+                 'recipes_ingredientinrecipe')
+
+
+def recipe_writes(queries):
+    """Изменения рецепта и его связей, без версий и счётчиков."""
+    return [
+        query['sql'] for query in queries
+        if query['sql'].startswith(WRITES)
+        and any(table in query['sql'].split('WHERE')[0]
+                for table in RECIPE_TABLES)
+    ]
+
+
+def current_payload(recipe):
+    return {
+        'tags': list(RecipeTag.objects.filter(
+            recipe=recipe).values_list('tag_id', flat=True)),
+        'ingredients': [
+            {'id': row.ingredient_id, 'amount': row.amount}
+            for row in IngredientInRecipe.objects.filter(recipe=recipe)
+        ],
+    }
+
+
+def patch(client, recipe, payload):
+    with CaptureQueriesContext(connection) as context:
+        response = client.patch(f'/api/recipes/{recipe.pk}/', payload,
+                                format='json')
+    assert response.status_code == 200, response.data
+    return recipe_writes(context.captured_queries)
+
+
+@pytest.mark.django_db
+def test_title_edit_writes_only_recipe_row(user_client, recipe):
+    payload = current_payload(recipe)
+    payload['name'] = 'Новое название'
+    writes = patch(user_client, recipe, payload)
+    assert len(writes) == 1
+    assert writes[0].startswith('UPDATE "recipes_recipe"')
+
+
+@pytest.mark.django_db
+def test_resubmitting_same_relations_writes_nothing(user_client, recipe):
+    assert patch(user_client, recipe, current_payload(recipe)) == []
+
+
+@pytest.mark.django_db
+def test_amount_edit_is_one_bulk_update(user_client, recipe):
+    payload = current_payload(recipe)
+    payload['ingredients'][0]['amount'] += 5
+    writes = patch(user_client, recipe, payload)
+    assert len(writes) == 1
+    assert writes[0].startswith('UPDATE "recipes_ingredientinrecipe"')
+    assert IngredientInRecipe.objects.get(
+        recipe=recipe,
+        ingredient_id=payload['ingredients'][0]['id']).amount == 15
+
+
+@pytest.mark.django_db
+def test_replacing_tag_and_ingredient(user_client, recipe, tags, ingredients):
+    payload = current_payload(recipe)
+    payload['tags'] = [payload['tags'][0], tags[2].id]
+    payload['ingredients'][-1] = {'id': ingredients[9].id, 'amount': 3}
+    writes = patch(user_client, recipe, payload)
+    assert sorted(write.split(' ')[0] for write in writes) == [
+        'DELETE', 'DELETE', 'INSERT', 'INSERT']
+    assert set(RecipeTag.objects.filter(recipe=recipe).values_list(
+        'tag_id', flat=True)) == set(payload['tags'])
+    by_id = itemgetter('id')
+    assert sorted(current_payload(recipe)['ingredients'], key=by_id) == (
+        sorted(payload['ingredients'], key=by_id))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_version_is_bumped_after_commit(recipe):
+    key = recipe_key(recipe.pk)
+    before = get_version(key)
+    with transaction.atomic():
+        bump_recipes([recipe.pk])
+        assert get_version(key) == before
+    assert get_version(key) > before
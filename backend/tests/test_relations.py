@@ -0,0 +1,74 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+from recipes.relations import add_relations, remove_relations
+
+
+def counts(*recipes):
+    return [Recipe.objects.get(pk=recipe.pk).favorites_count
+            for recipe in recipes]
+
+
+@pytest.mark.django_db
+def test_add_counts_only_inserted_rows(user, other_user, make_recipes):
+    first, second, third = make_recipes(3)
+    # Связь, вставленная «одновременным» запросом между проверкой
+    # и вставкой, не должна попасть в added и увеличить счётчик.
+    FavoriteRecipe.objects.create(user=user, recipe=second)
+    added, existing, missing = add_relations(
+        FavoriteRecipe, user, [first.pk, second.pk, third.pk, 10 ** 6])
+    assert added == {first.pk, third.pk}
+    assert existing == {second.pk}
+    assert missing == {10 ** 6}
+    assert counts(first, second, third) == [1, 1, 1]
+    assert add_relations(FavoriteRecipe, user, [first.pk])[0] == set()
+    assert counts(first) == [1]
+
+
+@pytest.mark.django_db
+def test_remove_updates_counters(user, make_recipes):
+    first, second = make_recipes(2)
+    add_relations(ShoppingCart, user, [first.pk, second.pk])
+    assert remove_relations(ShoppingCart, user,
+                            [first.pk, 10 ** 6]) == {first.pk}
+    assert list(ShoppingCart.objects.values_list(
+        'recipe_id', flat=True)) == [second.pk]
+    assert Recipe.objects.get(pk=first.pk).in_cart_count == 0
+    assert Recipe.objects.get(pk=second.pk).in_cart_count == 1
+
+
+@pytest.mark.django_db
+def test_single_favorite_uses_batch_insert(user_client, recipe):
+    url = f'/api/recipes/{recipe.pk}/favorite/'
+    with CaptureQueriesContext(connection) as context:
+        response = user_client.post(url)
+    assert response.status_code == 201
+    assert any('ON CONFLICT' in query['sql']
+               for query in context.captured_queries)
+    assert user_client.post(url).status_code == 400
+    assert user_client.post('/api/recipes/1000000/favorite/').status_code == (
+        404)
+    assert counts(recipe) == [1]
+    assert user_client.delete(url).status_code == 204
+    assert counts(recipe) == [0]
+    assert user_client.delete(url).status_code == 400
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('size', [5, 50])
+def test_batch_remove_queries_do_not_depend_on_size(
+        user, user_client, make_recipes, django_assert_num_queries, size):
+    recipe_ids = [recipe.pk for recipe in make_recipes(size)]
+    add_relations(ShoppingCart, user, recipe_ids)
+    # Токен, точка сохранения, DELETE ... RETURNING, UPDATE счётчиков,
+    # освобождение точки сохранения.
+    with django_assert_num_queries(5):
+        response = user_client.delete('/api/recipes/shopping_cart/',
+                                      {'recipes': recipe_ids}, format='json')
+    assert response.status_code == 200
+    assert {item['status'] for item in response.data['results']} == {
+        'removed'}
+    assert not ShoppingCart.objects.exists()
+    assert set(Recipe.objects.values_list('in_cart_count', flat=True)) == {0}
@@ -0,0 +1,71 @@
+import json
+import os
+
+import pytest
+
+from api.export_cache import ExportCache, export_cache
+from recipes.models import ShoppingCart
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('value, detailed', [
+    ('1', True), ('true', True), ('yes', True),
+    ('0', False), ('false', False), ('', False),
+])
+def test_detailed_flag_is_parsed(user_client, user, recipe, value, detailed):
+    ShoppingCart.objects.create(user=user, recipe=recipe)
+    response = user_client.get('/api/recipes/download_shopping_cart/',
+                               {'format': 'json', 'detailed': value})
+    assert response.status_code == 200
+    data = json.loads(b''.join(response.streaming_content))
+    assert ('recipes' in data) is detailed
+
+
+def download(client, **params):
+    response = client.get('/api/recipes/download_shopping_cart/', params)
+    assert response.status_code == 200
+    return b''.join(response.streaming_content)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('export_format', ['pdf', 'txt', 'csv', 'json'])
+def test_export_is_cached_while_streaming(user_client, user, recipe,
+                                          export_format):
+    ShoppingCart.objects.create(user=user, recipe=recipe)
+    stats = export_cache.stats()
+    first = download(user_client, format=export_format)
+    assert export_cache.stats()['entries'] == stats['entries'] + 1
+    assert download(user_client, format=export_format) == first
+    assert export_cache.stats()['hits'] == stats['hits'] + 1
+
+
+@pytest.mark.django_db
+def test_export_cache_evicts_least_recently_used(tmp_path):
+    cache = ExportCache(location=str(tmp_path), max_size=10)
+    cache.set('a', b'aaaa')
+    cache.set('b', b'bbbb')
+    os.utime(cache.path('a'), (1, 1))
+    os.utime(cache.path('b'), (2, 2))
+    assert cache.get('a') == b'aaaa'
+    cache.set('c', b'cccc')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'aaaa'
+    assert cache.get('c') == b'cccc'
+    cache.set('huge', b'x' * 11)
+    assert cache.get('huge') is None
+    assert cache.stats()['size'] == 8
+
+
+@pytest.mark.django_db
+def test_etag_differs_by_format_and_detailed(user_client, user, recipe):
+    ShoppingCart.objects.create(user=user, recipe=recipe)
+    etags = set()
+    for export_format in ('pdf', 'txt', 'json'):
+        for detailed in ('0', '1'):
+            response = user_client.get(
+                '/api/recipes/download_shopping_cart/',
+                {'format': export_format, 'detailed': detailed})
+            assert response.status_code == 200
+            assert 'Accept' in response['Vary']
+            etags.add(response['ETag'])
+    assert len(etags) == 6
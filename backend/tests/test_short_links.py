@@ -0,0 +1,39 @@
+import pytest
+from django.db import OperationalError
+from django.db.models import QuerySet
+
+from recipes.models import Recipe
+from recipes.short_links import HitCounter, hit_counter, short_code
+
+
+def fail_update(*args, **kwargs):
+    raise OperationalError('database is unavailable')
+
+
+@pytest.mark.django_db
+def test_failed_flush_keeps_hits(recipe, monkeypatch):
+    counter = HitCounter(flush_size=10, flush_interval=60)
+    counter.record(recipe.pk)
+    counter.record(recipe.pk)
+    monkeypatch.setattr(QuerySet, 'update', fail_update)
+    assert not counter.flush()
+    monkeypatch.undo()
+    assert counter.hits[recipe.pk] == 2
+    assert counter.flush()
+    assert Recipe.objects.get(pk=recipe.pk).short_link_hits == 2
+    assert not counter.hits
+
+
+@pytest.mark.django_db
+def test_redirect_survives_database_error(client, recipe, monkeypatch):
+    monkeypatch.setattr(hit_counter, 'flush_size', 1)
+    monkeypatch.setattr(hit_counter, 'hits', hit_counter.hits.copy())
+    hit_counter.hits.clear()
+    client.get(f'/{short_code(recipe.pk)}')
+    monkeypatch.setattr(QuerySet, 'update', fail_update)
+    response = client.get(f'/{short_code(recipe.pk)}')
+    assert response.status_code == 302
+    assert response['Location'] == f'/recipes/{recipe.pk}/'
+    assert hit_counter.hits[recipe.pk] == 1
+    monkeypatch.undo()
+    assert Recipe.objects.get(pk=recipe.pk).short_link_hits == 1
@@ -0,0 +1,48 @@
+import base64
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from api import uploads
+from api.uploads import decode_data_url, decoded_size
+
+
+def png_data_url(color, wrap=None, newline='\n'):
+    buffer = BytesIO()
+    Image.new('RGB', (120, 80), color).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    if wrap:
+        encoded = newline.join(
+            encoded[start:start + wrap]
+            for start in range(0, len(encoded), wrap)) + newline
+    return 'data:image/png;base64,' + encoded, buffer.getvalue()
+
+
+@pytest.mark.parametrize('wrap, newline', [
+    (None, ''), (76, '\n'), (76, '\r\n'), (64, ' ')])
+def test_wrapped_base64_is_decoded(monkeypatch, wrap, newline):
+    # Части не кратны 4 и режут строки посередине.
+    monkeypatch.setattr(uploads, 'DECODE_CHUNK_SIZE', 101)
+    data, content = png_data_url('red', wrap, newline)
+    start = data.index(',') + 1
+    assert decoded_size(data, start) == len(content)
+    upload = decode_data_url(data)
+    assert upload.read() == content
+    assert upload.size == len(content)
+
+
+@pytest.mark.django_db
+def test_wrapped_avatar_is_accepted(user_client):
+    data, _ = png_data_url('green', wrap=76)
+    response = user_client.put('/api/users/me/avatar/', {'avatar': data},
+                               format='json')
+    assert response.status_code == 200
+    assert response.data['avatar']
+
+
+@pytest.mark.parametrize('tail', ['A', '*AAA'])
+def test_invalid_base64_is_rejected(tail):
+    data, _ = png_data_url('blue')
+    with pytest.raises(uploads.serializers.ValidationError):
+        decode_data_url(data + tail)